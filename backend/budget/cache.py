@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_TTL = float(os.environ.get('REFERENCE_CACHE_TTL', '60'))
+CACHE_MAX_SIZE = int(os.environ.get('REFERENCE_CACHE_SIZE', '256'))
+
+
+class TTLCache:
+    '''Кэш справочных данных между тёплыми вызовами: TTL и вытеснение давно неиспользуемых'''
+
+    def __init__(self, ttl: float = CACHE_TTL, max_size: int = CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        '''Возвращает (найдено, значение); просроченные записи удаляются'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        '''Значение из кэша или результат loader(), который сразу кладётся в кэш'''
+        found, value = self.get(key)
+        if not found:
+            value = loader()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, *keys):
+        '''Сбрасывает записи по ключам или по префиксу-кортежу; без аргументов — весь кэш'''
+        with self._lock:
+            if not keys:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                return
+            for stored in list(self._entries):
+                for key in keys:
+                    if stored == key or (isinstance(stored, tuple) and stored[:1] == (key,)):
+                        del self._entries[stored]
+                        self.invalidations += 1
+                        break
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'invalidations': self.invalidations,
+            'size': len(self._entries),
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
@@ -3,16 +3,42 @@ import os
 from datetime import datetime, timedelta
 
 try:
-    import psycopg2
     from psycopg2.extras import RealDictCursor
 except ImportError:
-    import psycopg2_binary as psycopg2
     from psycopg2_binary.extras import RealDictCursor
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
+from cache import TTLCache
+from conditional import cache_headers, etag_matches, make_etag, not_modified, reference_version
+from db import get_connection, release_connection
+from encoder import encode, fetch_dicts, json_cursor
+from export import export_filters, export_request, export_response
+from metrics import dumps, instrumented, register_stats
+from pagination import page_request, split_page
+
 SCHEMA = os.environ.get('MAIN_DB_SCHEMA', 'public')
+TRANSACTION_PAGE_KEYS = ('date', 'created_at', 'id')
+
+reference_cache = TTLCache()
+register_stats('reference_cache', reference_cache.stats)
+
+
+def load_settings(cur, conn) -> dict:
+    '''Настройки пользователя; при первом обращении создаёт строку по умолчанию'''
+    cur.execute(f"SELECT id, daily_calorie_goal FROM {SCHEMA}.user_settings LIMIT 1")
+    row = cur.fetchone()
+    if not row:
+        cur.execute(f"INSERT INTO {SCHEMA}.user_settings (daily_calorie_goal) VALUES (2000) RETURNING id, daily_calorie_goal")
+        row = cur.fetchone()
+        conn.commit()
+    return dict(row)
 
 
+def load_categories(cur) -> list:
+    cur.execute(f'SELECT * FROM {SCHEMA}.budget_categories ORDER BY type, name')
+    return [dict(c) for c in cur.fetchall()]
+
+
+@instrumented
 def handler(event: dict, context) -> dict:
     '''API для управления бюджетом, аналитикой и настройками пользователя'''
     method = event.get('httpMethod', 'GET')
@@ -23,31 +49,50 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
             'body': '',
             'isBase64Encoded': False
         }
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
         query_params = event.get('queryStringParameters', {}) or {}
         action = query_params.get('action')
         
+        if action == 'export' and method == 'GET':
+            try:
+                fmt, date_from, date_to, after = export_request(query_params, len(TRANSACTION_PAGE_KEYS))
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Invalid export parameters'}),
+                    'isBase64Encoded': False
+                }
+            where, params = export_filters(
+                't.date', ('t.date', 't.created_at', 't.id'), date_from, date_to, after
+            )
+            return export_response(
+                conn,
+                f'''SELECT t.id, t.date, t.created_at, t.type, t.amount, c.name AS category,
+                        t.description, t.receipt_id
+                    FROM {SCHEMA}.transactions t
+                    LEFT JOIN {SCHEMA}.budget_categories c ON c.id = t.category_id
+                    {where}
+                    ORDER BY t.date, t.created_at, t.id''',
+                params, fmt, after is None, 'transactions', TRANSACTION_PAGE_KEYS
+            )
+
         if action == 'settings':
             if method == 'GET':
-                cur.execute(f"SELECT id, daily_calorie_goal FROM {SCHEMA}.user_settings LIMIT 1")
-                row = cur.fetchone()
-                if not row:
-                    cur.execute(f"INSERT INTO {SCHEMA}.user_settings (daily_calorie_goal) VALUES (2000) RETURNING id, daily_calorie_goal")
-                    row = cur.fetchone()
-                    conn.commit()
+                settings = reference_cache.get_or_load('settings', lambda: load_settings(cur, conn))
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(row), default=str),
+                    'body': dumps(settings, default=str),
                     'isBase64Encoded': False
                 }
             elif method == 'PUT':
@@ -60,21 +105,25 @@ def handler(event: dict, context) -> dict:
                 """, (data.get('daily_calorie_goal', 2000),))
                 row = cur.fetchone()
                 conn.commit()
+                reference_cache.invalidate('settings')
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(row), default=str),
+                    'body': dumps(dict(row), default=str),
                     'isBase64Encoded': False
                 }
 
         if method == 'GET':
             if action == 'categories':
-                cur.execute(f'SELECT * FROM {SCHEMA}.budget_categories ORDER BY type, name')
-                categories = cur.fetchall()
+                version = reference_version(cur, SCHEMA, 'budget_categories')
+                etag = make_etag('categories', version)
+                if etag_matches(event, etag):
+                    return not_modified(etag)
+                categories = reference_cache.get_or_load(('categories', version), lambda: load_categories(cur))
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(c) for c in categories], default=str),
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **cache_headers(etag)},
+                    'body': dumps(categories, default=str),
                     'isBase64Encoded': False
                 }
 
@@ -85,10 +134,10 @@ def handler(event: dict, context) -> dict:
                 cur.execute(
                     f'''SELECT 
                         bc.id, bc.name, bc.type, bc.icon, bc.color,
-                        COALESCE(SUM(t.amount), 0) as total
+                        COALESCE(SUM(d.total), 0) as total
                     FROM {SCHEMA}.budget_categories bc
-                    LEFT JOIN {SCHEMA}.transactions t ON t.category_id = bc.id 
-                        AND t.date >= %s
+                    LEFT JOIN {SCHEMA}.daily_category_totals d ON d.category_id = bc.id 
+                        AND d.date >= %s
                     GROUP BY bc.id, bc.name, bc.type, bc.icon, bc.color
                     ORDER BY total DESC''',
                     (start_date,)
@@ -97,7 +146,17 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(a) for a in analytics], default=str),
+                    'body': dumps([dict(a) for a in analytics], default=str),
+                    'isBase64Encoded': False
+                }
+
+            try:
+                page_size, after = page_request(query_params, len(TRANSACTION_PAGE_KEYS))
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Invalid cursor'}),
                     'isBase64Encoded': False
                 }
 
@@ -116,36 +175,46 @@ def handler(event: dict, context) -> dict:
             if end_date:
                 conditions.append('t.date <= %s')
                 params.append(end_date)
+            summary_params = list(params)
+            if after:
+                conditions.append('(t.date, t.created_at, t.id) < (%s, %s, %s)')
+                params.extend(after)
             
             if conditions:
                 query += ' WHERE ' + ' AND '.join(conditions)
             
-            query += ' ORDER BY t.date DESC, t.created_at DESC'
-            
-            cur.execute(query, params)
-            transactions = cur.fetchall()
-
-            summary_query = f"""SELECT 
-                COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as total_income,
-                COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as total_expense
-            FROM {SCHEMA}.transactions
-            WHERE 1=1"""
+            query += ' ORDER BY t.date DESC, t.created_at DESC, t.id DESC'
+            if page_size:
+                query += ' LIMIT %s'
+                params.append(page_size + 1)
             
-            if start_date:
-                summary_query += ' AND date >= %s'
-            if end_date:
-                summary_query += ' AND date <= %s'
-            
-            cur.execute(summary_query, params if params else ())
-            summary = cur.fetchone()
+            with json_cursor(conn) as list_cur:
+                list_cur.execute(query, params)
+                transactions = fetch_dicts(list_cur)
+            result = {}
+            if page_size:
+                transactions, result['next_cursor'] = split_page(transactions, page_size, TRANSACTION_PAGE_KEYS)
+            result['transactions'] = transactions
+
+            if not after:
+                summary_query = f"""SELECT 
+                    COALESCE(SUM(CASE WHEN type = 'income' THEN total ELSE 0 END), 0) as total_income,
+                    COALESCE(SUM(CASE WHEN type = 'expense' THEN total ELSE 0 END), 0) as total_expense
+                FROM {SCHEMA}.daily_category_totals
+                WHERE 1=1"""
+                
+                if start_date:
+                    summary_query += ' AND date >= %s'
+                if end_date:
+                    summary_query += ' AND date <= %s'
+                
+                cur.execute(summary_query, summary_params)
+                result['summary'] = dict(cur.fetchone())
 
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'transactions': [dict(t) for t in transactions],
-                    'summary': dict(summary)
-                }, default=str),
+                'body': encode(result),
                 'isBase64Encoded': False
             }
 
@@ -160,10 +229,11 @@ def handler(event: dict, context) -> dict:
                 )
                 category = cur.fetchone()
                 conn.commit()
+                reference_cache.invalidate('categories')
                 return {
                     'statusCode': 201,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(category), default=str),
+                    'body': dumps(dict(category), default=str),
                     'isBase64Encoded': False
                 }
 
@@ -186,7 +256,7 @@ def handler(event: dict, context) -> dict:
             return {
                 'statusCode': 201,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(dict(transaction), default=str),
+                'body': dumps(dict(transaction), default=str),
                 'isBase64Encoded': False
             }
 
@@ -202,10 +272,11 @@ def handler(event: dict, context) -> dict:
                 )
                 category = cur.fetchone()
                 conn.commit()
+                reference_cache.invalidate('categories')
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(category) if category else {}, default=str),
+                    'body': dumps(dict(category) if category else {}, default=str),
                     'isBase64Encoded': False
                 }
 
@@ -216,7 +287,7 @@ def handler(event: dict, context) -> dict:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Transaction ID required'}),
+                        'body': dumps({'error': 'Transaction ID required'}),
                         'isBase64Encoded': False
                     }
                 
@@ -233,20 +304,21 @@ def handler(event: dict, context) -> dict:
                 category_id = query_params.get('id')
                 cur.execute(f'UPDATE {SCHEMA}.budget_categories SET name = name WHERE id = %s', (category_id,))
                 conn.commit()
+                reference_cache.invalidate('categories')
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True}),
+                    'body': dumps({'success': True}),
                     'isBase64Encoded': False
                 }
 
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': dumps({'error': 'Method not allowed'}),
             'isBase64Encoded': False
         }
 
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
@@ -0,0 +1,211 @@
+import functools
+import json
+import os
+import re
+import sys
+import time
+
+try:
+    from psycopg2 import extensions
+except ImportError:
+    from psycopg2_binary import extensions
+
+REQUEST_LOG = os.environ.get('REQUEST_LOG', '1') == '1'
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_MAX_LENGTH = 2000
+
+_TOKEN = re.compile(
+    r"(?P<string>[Ee]'(?:[^'\\]|''|\\.)*'|[BbXx]?'(?:[^']|'')*')"
+    r'|(?P<ident>"(?:[^"]|"")*"|[A-Za-z_][\w$]*|\$\d+|%(?:\([^)]*\))?s)'
+    r'|(?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)'
+    r'|(?P<space>\s+)'
+    r'|(?P<other>.)',
+    re.S
+)
+# После этих слов целое число — номер столбца или константа запроса, а не значение
+_POSITIONAL = {'SELECT', 'DISTINCT', 'RETURNING', 'BY'}
+_CLAUSES = _POSITIONAL | {
+    'WHERE', 'AND', 'OR', 'ON', 'SET', 'VALUES', 'HAVING', 'LIMIT', 'OFFSET', 'WHEN',
+    'THEN', 'ELSE', 'IN', 'IS', 'NOT', 'BETWEEN', 'LIKE', 'ILIKE', 'USING', 'FROM'
+}
+
+
+class RequestMetrics:
+    '''Счётчики SQL и сериализации за один вызов функции'''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.rows = 0
+        self.db_time = 0.0
+        self.json_time = 0.0
+        self.slow_statements = 0
+
+    def summary(self) -> dict:
+        return {
+            'statements': self.statements,
+            'rows': self.rows,
+            'db_ms': round(self.db_time * 1000, 2),
+            'json_ms': round(self.json_time * 1000, 2),
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'slow_statements': self.slow_statements
+        }
+
+    def server_timing(self) -> str:
+        s = self.summary()
+        return (f'db;dur={s["db_ms"]};desc="{s["statements"]} queries, {s["rows"]} rows", '
+                f'json;dur={s["json_ms"]}, total;dur={s["total_ms"]}')
+
+
+current = RequestMetrics()
+_stats_providers = {}
+
+
+def log(record: dict):
+    '''Одна JSON-строка в stdout — её забирает журнал платформы'''
+    print(json.dumps(record, ensure_ascii=False, default=str), file=sys.stdout, flush=True)
+
+
+def register_stats(name: str, provider):
+    '''Добавляет накопленные счётчики (кэши, пул) в итоговую строку журнала'''
+    _stats_providers[name] = provider
+
+
+def redact_params(params):
+    '''Оставляет от параметров только типы, значения в журнал не попадают'''
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [type(value).__name__ for value in params]
+    return type(params).__name__
+
+
+def redact_literals(query) -> tuple:
+    '''Текст запроса с литералами, заменёнными на ?, и число замен.
+
+    Строки в кавычках заменяются всегда. Числа — кроме номеров и констант в списках
+    SELECT, RETURNING, GROUP BY и ORDER BY (GROUP BY 1, 2; RETURNING 1): их пишет
+    код, а не пользователь. Идентификаторы (t1, "col 2"), плейсхолдеры и приведения
+    типов (::xid8) не трогаются.
+    '''
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    parts = []
+    redacted = 0
+    clause = None
+    previous = None
+    for match in _TOKEN.finditer(str(query)):
+        kind = match.lastgroup
+        token = match.group()
+        if kind == 'space':
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+            continue
+        if kind == 'string':
+            token = '?'
+            redacted += 1
+        elif kind == 'number':
+            if clause not in _POSITIONAL or previous not in (clause, ','):
+                token = '?'
+                redacted += 1
+        elif kind == 'ident' and token.upper() in _CLAUSES:
+            clause = token.upper()
+        elif token == '(':
+            clause = None
+        parts.append(token)
+        previous = token.upper() if kind == 'ident' else token
+    return ''.join(parts).strip(), redacted
+
+
+def redact_sql(query) -> str:
+    '''Текст запроса для журнала: литералы заменены на ?, длина ограничена'''
+    return redact_literals(query)[0][:SLOW_QUERY_MAX_LENGTH]
+
+
+_instrumented_factories = {}
+
+
+def instrumented_cursor(cursor_factory):
+    '''Подкласс курсора, который учитывает время, число запросов и строк'''
+    if cursor_factory not in _instrumented_factories:
+        class InstrumentedCursor(cursor_factory):
+            def execute(self, query, vars=None):
+                started = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    current.statements += 1
+                    current.db_time += elapsed
+                    if self.description is not None and self.rowcount > 0:
+                        current.rows += self.rowcount
+                    if elapsed * 1000 >= SLOW_QUERY_MS:
+                        current.slow_statements += 1
+                        text, inlined = redact_literals(query)
+                        log({
+                            'event': 'slow_query',
+                            'duration_ms': round(elapsed * 1000, 2),
+                            'rows': self.rowcount,
+                            'query': text[:SLOW_QUERY_MAX_LENGTH],
+                            'params': redact_params(vars),
+                            # execute_values подставляет значения в текст сам и передаёт vars=None
+                            **({'inlined_literals': inlined} if vars is None and inlined else {})
+                        })
+
+        _instrumented_factories[cursor_factory] = InstrumentedCursor
+    return _instrumented_factories[cursor_factory]
+
+
+class InstrumentedConnection(extensions.connection):
+    '''Соединение, все курсоры которого проходят через instrumented_cursor'''
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = instrumented_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+
+def dumps(obj, **kwargs) -> str:
+    '''json.dumps с учётом времени сериализации ответа'''
+    started = time.perf_counter()
+    try:
+        return json.dumps(obj, **kwargs)
+    finally:
+        current.json_time += time.perf_counter() - started
+
+
+def instrumented(handler):
+    '''Сбрасывает счётчики на вызов, пишет итог в журнал и, если включено, в Server-Timing'''
+    @functools.wraps(handler)
+    def wrapper(event: dict, context) -> dict:
+        current.reset()
+        response = None
+        try:
+            response = handler(event, context)
+            return response
+        finally:
+            status = response.get('statusCode') if isinstance(response, dict) else 500
+            if SERVER_TIMING and isinstance(response, dict):
+                response['headers'] = {
+                    **(response.get('headers') or {}),
+                    'Server-Timing': current.server_timing(),
+                    'Timing-Allow-Origin': '*'
+                }
+            if REQUEST_LOG:
+                log({
+                    'event': 'request',
+                    'function': getattr(context, 'function_name', None),
+                    'method': event.get('httpMethod', 'GET'),
+                    'action': (event.get('queryStringParameters') or {}).get('action'),
+                    'status': status,
+                    **current.summary(),
+                    **({'stats': {name: provider() for name, provider in _stats_providers.items()}}
+                       if _stats_providers else {})
+                })
+    return wrapper
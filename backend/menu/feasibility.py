@@ -0,0 +1,108 @@
+from units import convert
+
+STATUS_RANK = {'feasible': 0, 'partial': 1, 'missing': 2}
+
+
+def evaluate_recipes(rows: list, matcher) -> list:
+    '''Оценивает все рецепты по текущим запасам за один проход.
+
+    rows — строки recipes LEFT JOIN recipe_ingredients (recipe_id, recipe_name,
+    product_name, quantity, unit). Каждое уникальное название ингредиента
+    сопоставляется с запасами один раз, единицы пересчитываются одним вызовом
+    convert на пару (продукт, единица ингредиента). Если несколько ингредиентов рецепта
+    сопоставились с одним продуктом, их потребность суммируется в единицах
+    продукта и сравнивается с остатком целиком. Результат отсортирован: сначала
+    то, что можно приготовить, затем по доле имеющихся ингредиентов.
+    '''
+    matches = {}
+    recipes = {}
+    pairs = []
+    factors = {}
+    for row in rows:
+        recipe_id = row['recipe_id']
+        recipe = recipes.get(recipe_id)
+        if recipe is None:
+            recipe = recipes[recipe_id] = {
+                'recipe_id': recipe_id,
+                'name': row['recipe_name'],
+                'ingredients_total': 0,
+                'ingredients_available': 0,
+                'missing': []
+            }
+        name = row['product_name']
+        if name is None:
+            continue
+
+        product = matches.get(name, False)
+        if product is False:
+            key = name.lower()
+            product = matches.get(key, False)
+            if product is False:
+                product = matches[key] = matcher.match(name)
+            matches[name] = product
+        recipe['ingredients_total'] += 1
+        if product is None:
+            pairs.append((recipe, row, None, None, None))
+            continue
+        unit_key = (product['id'], row['unit'])
+        factors[unit_key] = product
+        pairs.append((recipe, row, product, unit_key, (recipe_id, product['id'])))
+
+    # Пересчёт линейный, поэтому convert считает один множитель «единица ингредиента →
+    # единица продукта» на пару, а не количество на каждую строку
+    factor_keys = list(factors)
+    factors = dict(zip(factor_keys, convert(
+        [1] * len(factor_keys),
+        [unit for _, unit in factor_keys],
+        [factors[key].get('unit') for key in factor_keys],
+        [factors[key].get('density') for key in factor_keys],
+        [factors[key].get('piece_weight') for key in factor_keys]
+    )))
+
+    # Потребность по (рецепт, продукт) в единицах продукта; несопоставимые единицы
+    # сравниваем как есть, как plan_recipe
+    needs = []
+    demand = {}
+    for recipe, row, product, unit_key, demand_key in pairs:
+        need = float(row['quantity'] or 0)
+        needs.append(need)
+        if product is not None:
+            factor = factors[unit_key]
+            demand[demand_key] = demand.get(demand_key, 0.0) + (need * factor if factor else need)
+
+    stock = {}
+    for (recipe, row, product, unit_key, demand_key), need in zip(pairs, needs):
+        have = 0.0
+        if product is not None:
+            on_hand = stock.get(product['id'])
+            if on_hand is None:
+                on_hand = stock[product['id']] = float(product['quantity'] or 0)
+            if round(demand[demand_key], 6) <= on_hand:
+                recipe['ingredients_available'] += 1
+                continue
+            factor = factors[unit_key]
+            have = on_hand / factor if factor else on_hand
+
+        recipe['missing'].append({
+            'name': row['product_name'],
+            'quantity': need,
+            'unit': row['unit'],
+            'matched_product': product['name'] if product else None,
+            'available': round(have, 3)
+        })
+
+    results = []
+    for recipe in recipes.values():
+        total = recipe['ingredients_total']
+        available_count = recipe['ingredients_available']
+        recipe['coverage'] = round(available_count / total, 3) if total else 1.0
+        if available_count == total:
+            recipe['status'] = 'feasible'
+        elif available_count:
+            recipe['status'] = 'partial'
+        else:
+            recipe['status'] = 'missing'
+        results.append(recipe)
+
+    results.sort(key=lambda r: (STATUS_RANK[r['status']], -r['coverage'], len(r['missing']), r['name'] or ''))
+    return results
@@ -1,46 +1,122 @@
 import json
 import os
 from datetime import datetime, date
-from difflib import SequenceMatcher
 from decimal import Decimal
 
 try:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
+    from psycopg2.extras import RealDictCursor, execute_values
 except ImportError:
-    import psycopg2_binary as psycopg2
-    from psycopg2_binary.extras import RealDictCursor
+    from psycopg2_binary.extras import RealDictCursor, execute_values
+
+from db import get_connection, release_connection
+from encoder import encode, fetch_dicts, json_cursor
+from export import export_filters, export_request, export_response
+from feasibility import evaluate_recipes
+from metrics import dumps, instrumented
+from matching import MatchCache, ProductMatcher, find_matching_product
+from nutrition import apply_nutrition, preview_nutrition, refresh_nutrition
+from sync import changes_since
+from units import convert, to_grams
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
 SCHEMA = os.environ.get('MAIN_DB_SCHEMA', 'public')
+MATCH_CACHE_DB = os.environ.get('MATCH_CACHE_DB', '0') == '1'
+SYNC_TABLES = ('food_diary',)
+FOOD_DIARY_EXPORT_KEYS = ('eaten_date', 'id')
+
+match_cache = MatchCache()
+
+# Запасы вместе с плотностью и весом штуки из справочника для пересчёта единиц
+STOCK_QUERY = f'''SELECT p.*, pc.density, pc.piece_weight
+    FROM {SCHEMA}.products p
+    LEFT JOIN LATERAL (
+        SELECT c.density, c.piece_weight FROM {SCHEMA}.product_catalog c
+        WHERE c.name_key = p.name_key LIMIT 1
+    ) pc ON TRUE
+    WHERE p.quantity > 0'''
 
 
 def decimal_default(obj):
-    '''Конвертирует Decimal в float для JSON сериализации'''
+    '''Конвертирует Decimal в float для JSON сериализации, остальное — в строку'''
     if isinstance(obj, Decimal):
         return float(obj)
-    raise TypeError
+    return str(obj)
+
+
+def diary_range(query_params: dict) -> tuple:
+    '''(from, to) дневника из YYYY-MM-DD; одна граница задаёт один день, ValueError при ошибке'''
+    date_from = query_params.get('from') or query_params.get('to')
+    date_to = query_params.get('to') or query_params.get('from')
+    date_from, date_to = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    if date_from > date_to:
+        raise ValueError('from is after to')
+    return date_from, date_to
+
+
+def build_matcher(cur, available_products: list) -> ProductMatcher:
+    '''Индекс по запасам с кэшем сопоставлений, общим для тёплых вызовов'''
+    matcher = ProductMatcher(available_products, cache=match_cache)
+    if MATCH_CACHE_DB:
+        match_cache.load(cur, f'{SCHEMA}.ingredient_match_cache')
+    return matcher
+
+
+def save_matches(cur):
+    if MATCH_CACHE_DB:
+        match_cache.save(cur, f'{SCHEMA}.ingredient_match_cache')
+
 
+def stock_in_units(pairs: list, target: str) -> list:
+    '''Пересчитывает пары (ингредиент, продукт) одним вызовом convert.
 
-def similarity(a: str, b: str) -> float:
-    '''Вычисляет схожесть двух строк (0-1)'''
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+    target='ingredient' — остаток продукта в единицах ингредиента,
+    target='product' — количество ингредиента в единицах продукта.
+    None — единицы несопоставимы, вызывающий сравнивает числа как есть.
+    '''
+    if target == 'ingredient':
+        quantities = [product['quantity'] for _, product in pairs]
+        from_units = [product['unit'] for _, product in pairs]
+        to_units = [ingredient['unit'] for ingredient, _ in pairs]
+    else:
+        quantities = [ingredient['quantity'] for ingredient, _ in pairs]
+        from_units = [ingredient['unit'] for ingredient, _ in pairs]
+        to_units = [product['unit'] for _, product in pairs]
+    return convert(
+        quantities, from_units, to_units,
+        [product.get('density') for _, product in pairs],
+        [product.get('piece_weight') for _, product in pairs]
+    )
 
 
-def find_matching_product(product_name: str, available_products: list) -> dict:
-    '''Находит наиболее подходящий продукт из запасов'''
-    best_match = None
-    best_score = 0.6
-    
-    for product in available_products:
-        score = similarity(product_name, product['name'])
-        if score > best_score:
-            best_score = score
-            best_match = product
-    
-    return best_match
+def consume_products(cur, usage: dict) -> dict:
+    '''Списывает продукты одним запросом; возвращает новые остатки по id.
 
+    Строки блокируются в порядке id, поэтому параллельные приготовления
+    не взаимоблокируются, а вычитание идёт от актуального остатка.
+    '''
+    if not usage:
+        return {}
+    rows = execute_values(
+        cur,
+        f'''WITH v(id, qty) AS (VALUES %s),
+            locked AS (
+                SELECT p.id FROM {SCHEMA}.products p
+                WHERE p.id IN (SELECT id::uuid FROM v)
+                ORDER BY p.id
+                FOR UPDATE
+            )
+            UPDATE {SCHEMA}.products p
+            SET quantity = GREATEST(p.quantity - v.qty::numeric, 0)
+            FROM v JOIN locked l ON l.id = v.id::uuid
+            WHERE p.id = l.id
+            RETURNING p.id, p.quantity''',
+        list(usage.items()),
+        page_size=len(usage),
+        fetch=True
+    )
+    return {str(row['id']): row['quantity'] for row in rows}
 
+
+@instrumented
 def handler(event: dict, context) -> dict:
     '''API для управления меню, рецептами, готовыми блюдами и дневником питания'''
     method = event.get('httpMethod', 'GET')
@@ -57,7 +133,7 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
@@ -65,73 +141,177 @@ def handler(event: dict, context) -> dict:
         action = query_params.get('action')
 
         if method == 'GET':
+            if action == 'export_food_diary':
+                try:
+                    fmt, date_from, date_to, after = export_request(query_params, len(FOOD_DIARY_EXPORT_KEYS))
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': 'Invalid export parameters'}),
+                        'isBase64Encoded': False
+                    }
+                where, params = export_filters('eaten_date', FOOD_DIARY_EXPORT_KEYS, date_from, date_to, after)
+                return export_response(
+                    conn,
+                    f'''SELECT id, eaten_date, meal_type, meal_name, portion_weight, calories, notes
+                        FROM {SCHEMA}.food_diary
+                        {where}
+                        ORDER BY eaten_date, id''',
+                    params, fmt, after is None, 'food_diary', FOOD_DIARY_EXPORT_KEYS
+                )
+
             if action == 'food_diary':
+                if 'since' in query_params:
+                    try:
+                        result = changes_since(cur, SCHEMA, query_params['since'], SYNC_TABLES)
+                    except ValueError:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': dumps({'error': 'Invalid sync token'}),
+                            'isBase64Encoded': False
+                        }
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps(result, default=decimal_default),
+                        'isBase64Encoded': False
+                    }
+
+                if query_params.get('from') or query_params.get('to'):
+                    try:
+                        date_from, date_to = diary_range(query_params)
+                    except ValueError:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': dumps({'error': 'Invalid date range'}),
+                            'isBase64Encoded': False
+                        }
+                    with json_cursor(conn, decimal=float) as list_cur:
+                        list_cur.execute(
+                            f'''SELECT DATE(eaten_date) AS date,
+                                    SUM(calories) AS total_calories,
+                                    SUM(portion_weight) AS total_weight,
+                                    COUNT(*) AS entries_count,
+                                    SUM(SUM(calories)) OVER () AS grand_total
+                                FROM {SCHEMA}.food_diary 
+                                WHERE eaten_date >= %(from)s AND eaten_date < %(to)s::date + 1
+                                GROUP BY DATE(eaten_date)
+                                ORDER BY DATE(eaten_date)''',
+                            {'from': date_from, 'to': date_to}
+                        )
+                        days = fetch_dicts(list_cur)
+                    total_calories = days[0]['grand_total'] if days else 0
+                    for day in days:
+                        del day['grand_total']
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': encode({
+                            'days': days,
+                            'total_calories': total_calories
+                        }, default=decimal_default),
+                        'isBase64Encoded': False
+                    }
+                
                 date_param = query_params.get('date')
                 if date_param == 'today' or not date_param:
                     today = date.today()
-                    cur.execute(
-                        f'''SELECT * FROM {SCHEMA}.food_diary 
-                            WHERE DATE(eaten_date) = %s 
-                            ORDER BY eaten_date DESC''',
-                        (today,)
-                    )
-                    entries = cur.fetchall()
+                    with json_cursor(conn, decimal=float) as list_cur:
+                        list_cur.execute(
+                            f'''SELECT * FROM {SCHEMA}.food_diary 
+                                WHERE eaten_date >= %(day)s AND eaten_date < %(day)s::date + 1
+                                ORDER BY eaten_date DESC''',
+                            {'day': today}
+                        )
+                        entries = fetch_dicts(list_cur)
                     
                     total_calories = sum(float(e['calories']) for e in entries)
                     
                     return {
                         'statusCode': 200,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({
-                            'entries': [dict(e) for e in entries],
+                        'body': encode({
+                            'entries': entries,
                             'total_calories': total_calories
-                        }, default=decimal_default, ensure_ascii=False),
+                        }, default=decimal_default),
                         'isBase64Encoded': False
                     }
                 else:
-                    cur.execute(
-                        f'''SELECT * FROM {SCHEMA}.food_diary 
-                            WHERE DATE(eaten_date) = %s 
-                            ORDER BY eaten_date DESC''',
-                        (date_param,)
-                    )
-                    entries = cur.fetchall()
+                    with json_cursor(conn, decimal=float) as list_cur:
+                        list_cur.execute(
+                            f'''SELECT * FROM {SCHEMA}.food_diary 
+                                WHERE eaten_date >= %(day)s::date AND eaten_date < %(day)s::date + 1
+                                ORDER BY eaten_date DESC''',
+                            {'day': date_param}
+                        )
+                        entries = fetch_dicts(list_cur)
                     return {
                         'statusCode': 200,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps([dict(e) for e in entries], default=decimal_default, ensure_ascii=False),
+                        'body': encode(entries, default=decimal_default),
                         'isBase64Encoded': False
                     }
 
+            if action == 'feasibility':
+                # Кортежный курсор с numeric сразу во float: без RealDictRow и Decimal на каждую строку
+                with json_cursor(conn, decimal=float) as list_cur:
+                    list_cur.execute(
+                        f'''SELECT r.id AS recipe_id, r.name AS recipe_name,
+                                ri.product_name, ri.quantity, ri.unit
+                            FROM {SCHEMA}.recipes r
+                            LEFT JOIN {SCHEMA}.recipe_ingredients ri ON ri.recipe_id = r.id'''
+                    )
+                    rows = fetch_dicts(list_cur)
+                    list_cur.execute(STOCK_QUERY)
+                    stock = fetch_dicts(list_cur)
+                matcher = build_matcher(cur, stock)
+
+                results = evaluate_recipes(rows, matcher)
+                status = query_params.get('status')
+                if status:
+                    results = [r for r in results if r['status'] in status.split(',')]
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': encode(results),
+                    'isBase64Encoded': False
+                }
+
             if action == 'prepared_meals':
-                cur.execute(
-                    f'''SELECT pm.*, r.name as recipe_name, r.image_url
-                        FROM {SCHEMA}.prepared_meals pm
-                        JOIN {SCHEMA}.recipes r ON pm.recipe_id = r.id
-                        WHERE pm.status = 'available'
-                        ORDER BY pm.prepared_date DESC'''
-                )
-                meals = cur.fetchall()
+                with json_cursor(conn) as list_cur:
+                    list_cur.execute(
+                        f'''SELECT pm.*, r.name as recipe_name, r.image_url
+                            FROM {SCHEMA}.prepared_meals pm
+                            JOIN {SCHEMA}.recipes r ON pm.recipe_id = r.id
+                            WHERE pm.status = 'available'
+                            ORDER BY pm.prepared_date DESC'''
+                    )
+                    meals = fetch_dicts(list_cur)
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(m) for m in meals], default=str),
+                    'body': encode(meals),
                     'isBase64Encoded': False
                 }
 
             if action == 'planned':
-                cur.execute(
-                    f'''SELECT pr.*, r.name as recipe_name, r.total_calories, r.cooking_time
-                        FROM {SCHEMA}.planned_recipes pr
-                        JOIN {SCHEMA}.recipes r ON pr.recipe_id = r.id
-                        WHERE pr.status = 'planned'
-                        ORDER BY pr.planned_date DESC'''
-                )
-                planned = cur.fetchall()
+                with json_cursor(conn) as list_cur:
+                    list_cur.execute(
+                        f'''SELECT pr.*, r.name as recipe_name, r.total_calories, r.cooking_time
+                            FROM {SCHEMA}.planned_recipes pr
+                            JOIN {SCHEMA}.recipes r ON pr.recipe_id = r.id
+                            WHERE pr.status = 'planned'
+                            ORDER BY pr.planned_date DESC'''
+                    )
+                    planned = fetch_dicts(list_cur)
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(p) for p in planned], default=str),
+                    'body': encode(planned),
                     'isBase64Encoded': False
                 }
 
@@ -139,6 +319,11 @@ def handler(event: dict, context) -> dict:
             if recipe_id:
                 cur.execute(f'SELECT * FROM {SCHEMA}.recipes WHERE id = %s', (recipe_id,))
                 recipe = cur.fetchone()
+                if recipe and recipe['nutrition_stale']:
+                    # Чтение не блокирует и не пишет: устаревшее считается на лету, сохраняется при записи
+                    nutrition = preview_nutrition(cur, SCHEMA, [recipe['id']]).get(str(recipe['id']))
+                    if nutrition:
+                        recipe = apply_nutrition(dict(recipe), nutrition)
                 
                 cur.execute(
                     f'SELECT * FROM {SCHEMA}.recipe_ingredients WHERE recipe_id = %s',
@@ -149,19 +334,25 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
+                    'body': dumps({
                         'recipe': dict(recipe) if recipe else None,
                         'ingredients': [dict(i) for i in ingredients]
                     }, default=str),
                     'isBase64Encoded': False
                 }
 
-            cur.execute(f'SELECT * FROM {SCHEMA}.recipes ORDER BY created_at DESC')
-            recipes = cur.fetchall()
+            with json_cursor(conn) as list_cur:
+                list_cur.execute(f'SELECT * FROM {SCHEMA}.recipes ORDER BY created_at DESC')
+                recipes = fetch_dicts(list_cur)
+            if any(recipe['nutrition_stale'] for recipe in recipes):
+                nutrition = preview_nutrition(cur, SCHEMA)
+                for recipe in recipes:
+                    if recipe['id'] in nutrition:
+                        apply_nutrition(recipe, nutrition[recipe['id']])
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([dict(r) for r in recipes], default=str),
+                'body': encode(recipes),
                 'isBase64Encoded': False
             }
 
@@ -177,24 +368,30 @@ def handler(event: dict, context) -> dict:
                 )
                 ingredients = cur.fetchall()
                 
-                cur.execute(
-                    f'SELECT * FROM {SCHEMA}.products WHERE quantity > 0'
-                )
+                cur.execute(STOCK_QUERY)
                 available_products = cur.fetchall()
+                matcher = build_matcher(cur, available_products)
+                
+                matched = [
+                    (ingredient, find_matching_product(ingredient['product_name'], matcher))
+                    for ingredient in ingredients
+                ]
+                available = iter(stock_in_units([pair for pair in matched if pair[1]], 'ingredient'))
                 
                 missing_products = []
-                for ingredient in ingredients:
-                    matched_product = find_matching_product(
-                        ingredient['product_name'],
-                        available_products
-                    )
+                for ingredient, matched_product in matched:
+                    have = 0
+                    if matched_product:
+                        have = next(available)
+                        if have is None:
+                            have = float(matched_product['quantity'])
                     
-                    if not matched_product or matched_product['quantity'] < ingredient['quantity']:
+                    if not matched_product or have < float(ingredient['quantity']):
                         missing_products.append({
                             'name': ingredient['product_name'],
                             'quantity': float(ingredient['quantity']),
                             'unit': ingredient['unit'],
-                            'available': float(matched_product['quantity']) if matched_product else 0
+                            'available': round(have, 3)
                         })
                 
                 if missing_products:
@@ -213,12 +410,13 @@ def handler(event: dict, context) -> dict:
                     (recipe_id, json.dumps(missing_products))
                 )
                 planned = cur.fetchone()
+                save_matches(cur)
                 conn.commit()
                 
                 return {
                     'statusCode': 201,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
+                    'body': dumps({
                         'planned': dict(planned),
                         'missing_products': missing_products
                     }, default=str),
@@ -240,7 +438,7 @@ def handler(event: dict, context) -> dict:
                     return {
                         'statusCode': 404,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Planned recipe not found'}),
+                        'body': dumps({'error': 'Planned recipe not found'}),
                         'isBase64Encoded': False
                     }
                 
@@ -250,40 +448,52 @@ def handler(event: dict, context) -> dict:
                 )
                 ingredients = cur.fetchall()
                 
-                cur.execute(f'SELECT * FROM {SCHEMA}.products WHERE quantity > 0')
+                cur.execute(STOCK_QUERY)
                 available_products = cur.fetchall()
+                matcher = build_matcher(cur, available_products)
+                
+                matched = []
+                for ingredient in ingredients:
+                    matched_product = find_matching_product(ingredient['product_name'], matcher)
+                    if matched_product:
+                        matched.append((ingredient, matched_product))
+                consumed = stock_in_units(matched, 'product')
+                weights = to_grams(
+                    [ingredient['quantity'] for ingredient, _ in matched],
+                    [ingredient['unit'] for ingredient, _ in matched],
+                    [product.get('density') for _, product in matched],
+                    [product.get('piece_weight') for _, product in matched]
+                )
                 
                 total_calories = 0
                 total_weight = 0
+                usage = {}
                 
-                for ingredient in ingredients:
-                    matched_product = find_matching_product(
-                        ingredient['product_name'],
-                        available_products
-                    )
+                for (ingredient, matched_product), quantity, ingredient_weight_g in zip(matched, consumed, weights):
+                    product_id = str(matched_product['id'])
+                    if quantity is None:
+                        quantity = float(ingredient['quantity'])
+                    usage[product_id] = usage.get(product_id, 0) + Decimal(str(round(quantity, 3)))
                     
-                    if matched_product:
-                        new_qty = max(0, matched_product['quantity'] - ingredient['quantity'])
-                        cur.execute(
-                            f'UPDATE {SCHEMA}.products SET quantity = %s WHERE id = %s',
-                            (new_qty, matched_product['id'])
-                        )
-                        
-                        if matched_product.get('calories_per_100g'):
-                            ingredient_weight_g = float(ingredient['quantity'])
-                            if ingredient['unit'] == 'кг':
-                                ingredient_weight_g *= 1000
-                            elif ingredient['unit'] == 'мл':
-                                pass
-                            elif ingredient['unit'] == 'л':
-                                ingredient_weight_g *= 1000
-                            
-                            calories = (float(matched_product['calories_per_100g']) * ingredient_weight_g) / 100
-                            total_calories += calories
-                            total_weight += ingredient_weight_g
+                    if matched_product.get('calories_per_100g') and ingredient_weight_g is not None:
+                        calories = (float(matched_product['calories_per_100g']) * ingredient_weight_g) / 100
+                        total_calories += calories
+                        total_weight += ingredient_weight_g
                 
+                consume_products(cur, usage)
                 calories_per_100g = (total_calories / total_weight * 100) if total_weight > 0 else 0
                 
+                refresh_nutrition(cur, SCHEMA, [planned['recipe_id']])
+                cur.execute(
+                    f'SELECT calories_per_100g, ingredients_weight FROM {SCHEMA}.recipes WHERE id = %s',
+                    (planned['recipe_id'],)
+                )
+                nutrition = cur.fetchone()
+                if nutrition['calories_per_100g'] is not None:
+                    # Расчёт по справочнику учитывает все ингредиенты, а не только найденные на складе
+                    calories_per_100g = nutrition['calories_per_100g']
+                    total_weight = nutrition['ingredients_weight']
+                
                 cur.execute(
                     f'''INSERT INTO {SCHEMA}.prepared_meals 
                         (recipe_id, servings_left, status, total_calories, total_weight)
@@ -296,13 +506,14 @@ def handler(event: dict, context) -> dict:
                     f"UPDATE {SCHEMA}.planned_recipes SET status = 'prepared' WHERE id = %s",
                     (planned_id,)
                 )
+                save_matches(cur)
                 
                 conn.commit()
                 
                 return {
                     'statusCode': 201,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(meal), default=str),
+                    'body': dumps(dict(meal), default=str),
                     'isBase64Encoded': False
                 }
 
@@ -326,7 +537,7 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 201,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(entry), default=decimal_default, ensure_ascii=False),
+                    'body': dumps(dict(entry), default=decimal_default, ensure_ascii=False),
                     'isBase64Encoded': False
                 }
 
@@ -353,12 +564,15 @@ def handler(event: dict, context) -> dict:
                         (recipe_id, ingredient['product_name'], ingredient['quantity'], ingredient['unit'])
                     )
                 
+                refresh_nutrition(cur, SCHEMA, [recipe_id])
+                cur.execute(f'SELECT * FROM {SCHEMA}.recipes WHERE id = %s', (recipe_id,))
+                recipe = cur.fetchone()
                 conn.commit()
                 
                 return {
                     'statusCode': 201,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(recipe), default=str),
+                    'body': dumps(dict(recipe), default=str),
                     'isBase64Encoded': False
                 }
 
@@ -373,7 +587,7 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True}),
+                    'body': dumps({'success': True}),
                     'isBase64Encoded': False
                 }
 
@@ -385,7 +599,7 @@ def handler(event: dict, context) -> dict:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Recipe ID required'}),
+                        'body': dumps({'error': 'Recipe ID required'}),
                         'isBase64Encoded': False
                     }
                 
@@ -409,7 +623,7 @@ def handler(event: dict, context) -> dict:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Meal ID required'}),
+                        'body': dumps({'error': 'Meal ID required'}),
                         'isBase64Encoded': False
                     }
                 
@@ -430,7 +644,7 @@ def handler(event: dict, context) -> dict:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Entry ID required'}),
+                        'body': dumps({'error': 'Entry ID required'}),
                         'isBase64Encoded': False
                     }
                 
@@ -447,10 +661,10 @@ def handler(event: dict, context) -> dict:
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': dumps({'error': 'Method not allowed'}),
             'isBase64Encoded': False
         }
 
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
@@ -0,0 +1,232 @@
+import hashlib
+from collections import Counter, OrderedDict, defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from heapq import nlargest
+
+try:
+    from psycopg2.extras import execute_values
+except ImportError:
+    from psycopg2_binary.extras import execute_values
+
+MATCH_THRESHOLD = 0.6
+MAX_CANDIDATES = 200
+MATCH_CACHE_SIZE = 1024
+WORD_TRIGRAMS_CACHE_SIZE = 65536
+
+
+def similarity(a: str, b: str) -> float:
+    '''Вычисляет схожесть двух строк (0-1)'''
+    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+
+@lru_cache(maxsize=WORD_TRIGRAMS_CACHE_SIZE)
+def word_trigrams(word: str) -> frozenset:
+    padded = f'  {word} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigrams(text: str) -> set:
+    '''Триграммы слов строки с дополнением пробелами, как в pg_trgm'''
+    grams = set()
+    for word in text.lower().split():
+        grams |= word_trigrams(word)
+    return grams
+
+
+class MatchCache:
+    '''LRU-кэш сопоставлений ингредиент → продукт, привязанный к версии запасов'''
+
+    def __init__(self, max_size: int = MATCH_CACHE_SIZE):
+        self.max_size = max_size
+        self.version = None
+        self._entries = OrderedDict()
+        self._dirty = {}
+        self._snapshot = {}
+        self._loaded_version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def sync(self, products: list) -> str:
+        '''Сверяет снимок запасов с прошлым и сбрасывает только затронутые имена'''
+        snapshot = {str(p['id']): p['name'].lower() for p in products}
+        digest = hashlib.blake2b(digest_size=8)
+        for product_id, name in sorted(snapshot.items()):
+            digest.update(f'{product_id}\x1f{name}\x1e'.encode())
+        version = digest.hexdigest()
+        if version == self.version:
+            return version
+
+        if self._entries:
+            removed = {pid for pid, name in self._snapshot.items() if snapshot.get(pid) != name}
+            added_grams = set()
+            for pid, name in snapshot.items():
+                if self._snapshot.get(pid) != name:
+                    added_grams |= trigrams(name)
+
+            for key, product_id in list(self._entries.items()):
+                if product_id in removed or trigrams(key) & added_grams:
+                    del self._entries[key]
+                    self.invalidations += 1
+
+        self._snapshot = snapshot
+        self.version = version
+        self._dirty = dict(self._entries)
+        return version
+
+    def get(self, key: str):
+        '''Возвращает (найдено, id продукта или None)'''
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key: str, product_id):
+        self._entries[key] = product_id
+        self._entries.move_to_end(key)
+        self._dirty[key] = product_id
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def load(self, cur, table: str):
+        '''Подгружает из таблицы записи для текущей версии запасов, не больше max_size.
+
+        Подгруженные записи становятся самыми давними в LRU: уже лежащие в памяти
+        использовались в этом процессе и вытесняются последними.
+        '''
+        if self._loaded_version == self.version:
+            return
+        cur.execute(
+            f'''SELECT ingredient_key, product_id FROM {table}
+                WHERE inventory_version = %s
+                ORDER BY updated_at DESC
+                LIMIT %s''',
+            (self.version, self.max_size)
+        )
+        for row in cur.fetchall():
+            if row['ingredient_key'] not in self._entries:
+                self._entries[row['ingredient_key']] = str(row['product_id']) if row['product_id'] else None
+                self._entries.move_to_end(row['ingredient_key'], last=False)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._loaded_version = self.version
+
+    def save(self, cur, table: str):
+        '''Сохраняет в таблицу записи, добавленные или перенесённые на новую версию.
+
+        Строки пишутся в порядке ключа: параллельные сохранения блокируют строки
+        в одном порядке и не встают во взаимоблокировку.
+        '''
+        if not self._dirty:
+            return
+        execute_values(
+            cur,
+            f'''INSERT INTO {table} (ingredient_key, product_id, inventory_version)
+                VALUES %s
+                ON CONFLICT (ingredient_key) DO UPDATE SET
+                    product_id = EXCLUDED.product_id,
+                    inventory_version = EXCLUDED.inventory_version,
+                    updated_at = CURRENT_TIMESTAMP''',
+            [(key, product_id, self.version) for key, product_id in sorted(self._dirty.items())],
+            page_size=len(self._dirty)
+        )
+        self._dirty = {}
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'size': len(self._entries),
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
+
+
+class ProductMatcher:
+    '''Инвертированный индекс триграмм по названиям продуктов для нечёткого поиска'''
+
+    def __init__(self, products: list, max_candidates: int = MAX_CANDIDATES, cache: MatchCache = None):
+        self.products = products
+        self.max_candidates = max_candidates
+        self.cache = cache
+        self._names = None
+        self._by_id = None
+        if cache is not None:
+            cache.sync(products)
+
+    def _build(self):
+        '''Строит индекс при первом промахе кэша'''
+        self._names = [p['name'].lower() for p in self.products]
+        self._exact = {}
+        self._postings = defaultdict(list)
+        for i, name in enumerate(self._names):
+            self._exact.setdefault(name, i)
+            for gram in trigrams(name):
+                self._postings[gram].append(i)
+
+    def candidates(self, name: str) -> list:
+        '''Индексы продуктов с наибольшим числом общих триграмм, в исходном порядке'''
+        if self._names is None:
+            self._build()
+        shared = Counter()
+        for gram in trigrams(name):
+            shared.update(self._postings.get(gram, ()))
+        top = nlargest(self.max_candidates, shared.items(), key=lambda kv: (kv[1], -kv[0]))
+        return sorted(i for i, _ in top)
+
+    def match(self, product_name: str, threshold: float = MATCH_THRESHOLD) -> dict:
+        '''Лучший продукт со схожестью выше порога; при равенстве — первый по списку'''
+        name = product_name.lower()
+        if self.cache is not None:
+            found, product_id = self.cache.get(name)
+            if found and product_id is None:
+                return None
+            if found:
+                if self._by_id is None:
+                    self._by_id = {}
+                    for product in self.products:
+                        self._by_id.setdefault(str(product['id']), product)
+                if product_id in self._by_id:
+                    return self._by_id[product_id]
+
+        best_match = self._match(name, threshold)
+        if self.cache is not None:
+            self.cache.put(name, str(best_match['id']) if best_match else None)
+        return best_match
+
+    def _match(self, name: str, threshold: float) -> dict:
+        if self._names is None:
+            self._build()
+        exact = self._exact.get(name)
+        if exact is not None:
+            return self.products[exact]
+
+        best_match = None
+        best_score = threshold
+        length = len(name)
+        for i in self.candidates(name):
+            other = self._names[i]
+            # real_quick_ratio без построения SequenceMatcher: его конструктор индексирует
+            # вторую строку, а большинство кандидатов отсеивается уже по длине
+            if 2.0 * min(length, len(other)) / (length + len(other)) <= best_score:
+                continue
+            matcher = SequenceMatcher(None, name, other)
+            if matcher.quick_ratio() <= best_score:
+                continue
+            score = matcher.ratio()
+            if score > best_score:
+                best_score = score
+                best_match = self.products[i]
+
+        return best_match
+
+
+def find_matching_product(product_name: str, available_products) -> dict:
+    '''Находит наиболее подходящий продукт из запасов (список или готовый ProductMatcher)'''
+    if not isinstance(available_products, ProductMatcher):
+        available_products = ProductMatcher(available_products)
+    return available_products.match(product_name)
@@ -0,0 +1,144 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+try:
+    from psycopg2.extras import execute_values
+except ImportError:
+    from psycopg2_binary.extras import execute_values
+
+from units import to_grams
+
+TENTH = Decimal('0.1')
+
+
+def compute_nutrition(rows: list) -> dict:
+    '''Калорийность рецептов по строкам ингредиентов со свойствами из справочника.
+
+    rows — строки (recipe_id, quantity, unit, calories_per_100g, density,
+    piece_weight); у рецепта без ингредиентов quantity и unit — None.
+    Веса всех строк пересчитываются в граммы одним вызовом to_grams, затем
+    суммируются по рецептам. Возвращает recipe_id → (калорий всего, вес
+    ингредиентов в граммах, калорий на 100 г). Значение — None, если хотя бы
+    один ингредиент не пересчитан в граммы (для калорий — или не найден в
+    справочнике): частичная сумма заменила бы введённую вручную калорийность
+    заниженной.
+    '''
+    grams = to_grams(
+        [row['quantity'] for row in rows],
+        [row['unit'] for row in rows],
+        [row['density'] for row in rows],
+        [row['piece_weight'] for row in rows]
+    )
+
+    totals = {}
+    for row, weight in zip(rows, grams):
+        calories, total_weight, count, weighed, known = totals.get(row['recipe_id'], (0.0, 0.0, 0, 0, 0))
+        if row['quantity'] is not None:
+            count += 1
+        if weight is not None:
+            total_weight += weight
+            weighed += 1
+            if row['calories_per_100g'] is not None:
+                calories += float(row['calories_per_100g']) * weight / 100
+                known += 1
+        totals[row['recipe_id']] = (calories, total_weight, count, weighed, known)
+
+    result = {}
+    for recipe_id, (calories, total_weight, count, weighed, known) in totals.items():
+        complete = count and known == count
+        result[recipe_id] = (
+            calories if complete else None,
+            total_weight if count and weighed == count else None,
+            calories / total_weight * 100 if complete and total_weight else None
+        )
+    return result
+
+
+def load_ingredients(cur, schema: str, recipe_ids: list) -> list:
+    '''Строки ингредиентов рецептов со свойствами из справочника для compute_nutrition'''
+    cur.execute(
+        f'''SELECT r.id AS recipe_id, ri.quantity, ri.unit,
+                pc.calories_per_100g, pc.density, pc.piece_weight
+            FROM {schema}.recipes r
+            LEFT JOIN {schema}.recipe_ingredients ri ON ri.recipe_id = r.id
+            LEFT JOIN LATERAL (
+                SELECT c.calories_per_100g, c.density, c.piece_weight FROM {schema}.product_catalog c
+                WHERE c.name_key = LOWER(TRIM(ri.product_name)) LIMIT 1
+            ) pc ON TRUE
+            WHERE r.id = ANY(%s::uuid[])''',
+        (recipe_ids,)
+    )
+    return cur.fetchall()
+
+
+def tenth(value):
+    '''Число как DECIMAL(_, 1) из БД; None остаётся None'''
+    return None if value is None else Decimal(value).quantize(TENTH, ROUND_HALF_UP)
+
+
+def preview_nutrition(cur, schema: str, recipe_ids: list = None) -> dict:
+    '''Калорийность рецептов, помеченных устаревшими, без блокировок и записи — для чтения.
+
+    Возвращает id рецепта → (калорий всего, вес, калорий на 100 г), как
+    compute_nutrition; сохраняет пересчёт refresh_nutrition на записи.
+    '''
+    where = 'AND id = ANY(%s::uuid[])' if recipe_ids is not None else ''
+    cur.execute(
+        f'SELECT id FROM {schema}.recipes WHERE nutrition_stale {where}',
+        ([str(recipe_id) for recipe_id in recipe_ids],) if recipe_ids is not None else None
+    )
+    stale = [str(row['id']) for row in cur.fetchall()]
+    if not stale:
+        return {}
+    nutrition = compute_nutrition(load_ingredients(cur, schema, stale))
+    return {str(recipe_id): values for recipe_id, values in nutrition.items()}
+
+
+def apply_nutrition(recipe: dict, values: tuple) -> dict:
+    '''Подставляет в строку рецепта значения preview_nutrition так же, как их записал бы refresh_nutrition'''
+    calories, weight, per_100g = values
+    if calories is not None:
+        recipe['total_calories'] = int(Decimal(calories).quantize(Decimal(1), ROUND_HALF_UP))
+    total = calories if calories is not None else recipe.get('total_calories')
+    servings = recipe.get('servings')
+    recipe['calories_per_serving'] = (
+        tenth(Decimal(str(total)) / int(servings)) if total is not None and servings else None
+    )
+    recipe['calories_per_100g'] = tenth(per_100g)
+    recipe['ingredients_weight'] = tenth(weight)
+    return recipe
+
+
+def refresh_nutrition(cur, schema: str, recipe_ids: list = None) -> int:
+    '''Пересчитывает помеченные устаревшими рецепты пакетно; возвращает их число.
+
+    Рецепты сначала блокируются, а ингредиенты читаются отдельным запросом уже
+    после блокировки: триггер, пометивший рецепт во время пересчёта, дождётся
+    коммита и снова поставит флаг. Пока не все ингредиенты найдены в
+    справочнике, введённая вручную total_calories сохраняется. Вызывается на
+    путях записи; чтение обходится preview_nutrition.
+    '''
+    where = 'AND id = ANY(%s::uuid[])' if recipe_ids is not None else ''
+    cur.execute(
+        f'''SELECT id FROM {schema}.recipes WHERE nutrition_stale {where}
+            ORDER BY id FOR UPDATE''',
+        ([str(recipe_id) for recipe_id in recipe_ids],) if recipe_ids is not None else None
+    )
+    stale = [str(row['id']) for row in cur.fetchall()]
+    if not stale:
+        return 0
+
+    nutrition = compute_nutrition(load_ingredients(cur, schema, stale))
+    execute_values(
+        cur,
+        f'''UPDATE {schema}.recipes r SET
+                total_calories = COALESCE(ROUND(v.calories::numeric)::integer, r.total_calories),
+                calories_per_serving = COALESCE(v.calories::numeric, r.total_calories) / NULLIF(r.servings, 0),
+                calories_per_100g = v.per_100g::numeric,
+                ingredients_weight = v.weight::numeric,
+                nutrition_stale = FALSE
+            FROM (VALUES %s) AS v(id, calories, weight, per_100g)
+            WHERE r.id = v.id::uuid''',
+        [(str(recipe_id), *values) for recipe_id, values in nutrition.items()],
+        page_size=len(nutrition)
+    )
+    return len(nutrition)
@@ -0,0 +1,116 @@
+BASE_UNITS = {'mass': 'г', 'volume': 'мл', 'count': 'шт'}
+
+# Единица → (величина, множитель к базовой единице величины)
+UNITS = {
+    'г': ('mass', 1.0),
+    'кг': ('mass', 1000.0),
+    'мг': ('mass', 0.001),
+    'мл': ('volume', 1.0),
+    'л': ('volume', 1000.0),
+    'ч.л.': ('volume', 5.0),
+    'ст.л.': ('volume', 15.0),
+    'стакан': ('volume', 250.0),
+    'шт': ('count', 1.0),
+}
+
+ALIASES = {
+    'гр': 'г', 'гр.': 'г', 'грамм': 'г', 'g': 'г',
+    'кг.': 'кг', 'килограмм': 'кг', 'kg': 'кг',
+    'мг.': 'мг', 'mg': 'мг',
+    'мл.': 'мл', 'ml': 'мл',
+    'л.': 'л', 'литр': 'л', 'l': 'л',
+    'ч. л.': 'ч.л.', 'чл': 'ч.л.', 'ст. л.': 'ст.л.', 'стл': 'ст.л.',
+    'шт.': 'шт', 'штук': 'шт', 'штука': 'шт', 'pcs': 'шт',
+}
+
+# Плотность по умолчанию, г/мл: как у воды — прежние расчёты считали мл за граммы
+DEFAULT_DENSITY = 1.0
+
+# Все написания единиц сразу с величиной и множителем, чтобы поиск был одним обращением к словарю
+_LOOKUP = {**{unit: (unit, *info) for unit, info in UNITS.items()},
+           **{alias: (unit, *UNITS[unit]) for alias, unit in ALIASES.items()}}
+
+
+def normalize_unit(unit: str) -> str:
+    '''Каноническое написание единицы; неизвестная возвращается очищенной'''
+    if not unit:
+        return unit
+    key = unit.strip().lower()
+    entry = _LOOKUP.get(key)
+    return entry[0] if entry else key
+
+
+def unit_info(unit: str) -> tuple:
+    '''(величина, множитель); для неизвестной единицы величина — сама единица'''
+    key = (unit or '').strip().lower()
+    entry = _LOOKUP.get(key)
+    return (entry[1], entry[2]) if entry else (key, 1.0)
+
+
+def _column(values, size: int, default=None) -> list:
+    return list(values) if values is not None else [default] * size
+
+
+def to_base(quantities: list, units: list) -> tuple:
+    '''Столбцы (величины, количества в базовых единицах) для списков количеств и единиц'''
+    infos = [unit_info(unit) for unit in units]
+    return [info[0] for info in infos], [float(q or 0) * info[1] for q, info in zip(quantities, infos)]
+
+
+def to_grams(quantities: list, units: list, densities: list = None, piece_weights: list = None) -> list:
+    '''Массы в граммах; None там, где пересчёт невозможен (штуки без веса штуки)'''
+    size = len(quantities)
+    kinds, values = to_base(quantities, units)
+    densities = _column(densities, size)
+    piece_weights = _column(piece_weights, size)
+    grams = []
+    for kind, value, density, piece_weight in zip(kinds, values, densities, piece_weights):
+        if kind == 'mass':
+            grams.append(value)
+        elif kind == 'volume':
+            grams.append(value * float(density or DEFAULT_DENSITY))
+        elif kind == 'count' and piece_weight:
+            grams.append(value * float(piece_weight))
+        else:
+            grams.append(None)
+    return grams
+
+
+def convert(quantities: list, from_units: list, to_units: list,
+            densities: list = None, piece_weights: list = None) -> list:
+    '''Пересчитывает количества в целевые единицы; None, если величины несопоставимы.
+
+    Внутри одной величины — через множители, между массой, объёмом и штуками —
+    через граммы с плотностью и весом штуки продукта.
+    '''
+    size = len(quantities)
+    densities = _column(densities, size)
+    piece_weights = _column(piece_weights, size)
+    from_kinds, values = to_base(quantities, from_units)
+    targets = [unit_info(unit) for unit in to_units]
+    grams = None
+    result = []
+    for i, (kind, value, (target_kind, target_factor)) in enumerate(zip(from_kinds, values, targets)):
+        if kind == target_kind:
+            result.append(value / target_factor)
+            continue
+        if grams is None:
+            grams = to_grams(quantities, from_units, densities, piece_weights)
+        g = grams[i]
+        if g is None:
+            result.append(None)
+        elif target_kind == 'mass':
+            result.append(g / target_factor)
+        elif target_kind == 'volume':
+            result.append(g / float(densities[i] or DEFAULT_DENSITY) / target_factor)
+        elif target_kind == 'count' and piece_weights[i]:
+            result.append(g / float(piece_weights[i]) / target_factor)
+        else:
+            result.append(None)
+    return result
+
+
+def units_sql() -> str:
+    '''Таблица единиц (unit, dimension, factor) как VALUES для SQL, включая синонимы'''
+    rows = ', '.join(f"('{unit}', '{kind}', {factor})" for unit, (_, kind, factor) in _LOOKUP.items())
+    return f'VALUES {rows}'
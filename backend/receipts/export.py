@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+import os
+from datetime import date
+
+from pagination import decode_cursor, encode_cursor
+
+EXPORT_ITERSIZE = int(os.environ.get('EXPORT_ITERSIZE', '2000'))
+# Тело ответа функции ограничено платформой, поэтому выгрузка отдаётся частями по курсору
+EXPORT_MAX_BYTES = int(os.environ.get('EXPORT_MAX_BYTES', str(3 * 1024 * 1024)))
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8'
+}
+
+
+def export_request(query_params: dict, key_count: int) -> tuple:
+    '''(формат, дата с, дата по, позиция курсора) из format=ndjson|csv, from, to, cursor; ValueError при ошибке'''
+    fmt = query_params.get('format', 'ndjson')
+    if fmt not in CONTENT_TYPES:
+        raise ValueError('Unsupported export format')
+    date_from = date.fromisoformat(query_params['from']) if query_params.get('from') else None
+    date_to = date.fromisoformat(query_params['to']) if query_params.get('to') else None
+    cursor = query_params.get('cursor')
+    return fmt, date_from, date_to, decode_cursor(cursor, key_count) if cursor else None
+
+
+def export_filters(date_column: str, key_columns: tuple, date_from, date_to, after) -> tuple:
+    '''(WHERE-условие, параметры) для периода по date_column и продолжения после курсора'''
+    conditions = []
+    params = []
+    if date_from:
+        conditions.append(f'{date_column} >= %s')
+        params.append(date_from)
+    if date_to:
+        conditions.append(f'{date_column} < %s::date + 1')
+        params.append(date_to)
+    if after:
+        conditions.append(f"({', '.join(key_columns)}) > ({', '.join(['%s'] * len(key_columns))})")
+        params.extend(after)
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ''), params
+
+
+def encode_rows(conn, query: str, params, fmt: str, state: dict,
+                header: bool = True, max_bytes: int = EXPORT_MAX_BYTES):
+    '''Кодирует строки запроса в NDJSON или CSV построчно, отдавая пачки строк.
+
+    Строки читаются именованным (серверным) курсором по EXPORT_ITERSIZE, так что
+    в памяти одновременно только одна пачка, сколько бы строк ни вернул запрос.
+    Когда отданный объём доходит до max_bytes, чтение прекращается, а последняя
+    отданная строка кладётся в state['last'] — по ней строится курсор продолжения.
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def csv_line(values) -> str:
+        writer.writerow(values)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    with conn.cursor(name='export') as cur:
+        cur.itersize = EXPORT_ITERSIZE
+        cur.execute(query, params)
+        rows = cur.fetchmany(EXPORT_ITERSIZE)
+        columns = [column.name for column in cur.description]
+        if fmt == 'csv' and header:
+            yield csv_line(columns)
+
+        written = 0
+        last = None
+        while rows:
+            chunk = []
+            for row in rows:
+                if fmt == 'csv':
+                    line = csv_line(['' if value is None else value for value in row])
+                else:
+                    line = json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False) + '\n'
+                size = len(line.encode('utf-8'))
+                if written + size > max_bytes and last is not None:
+                    state['last'] = dict(zip(columns, last))
+                    yield ''.join(chunk)
+                    return
+                chunk.append(line)
+                written += size
+                last = row
+            yield ''.join(chunk)
+            rows = cur.fetchmany(EXPORT_ITERSIZE)
+
+
+def export_response(conn, query: str, params, fmt: str, first_page: bool, name: str, keys: tuple) -> dict:
+    '''Ответ с частью выгрузки; курсор следующей части — в заголовке X-Next-Cursor'''
+    state = {}
+    body = ''.join(encode_rows(conn, query, params, fmt, state, header=first_page))
+    headers = {
+        'Content-Type': CONTENT_TYPES[fmt],
+        'Content-Disposition': f'attachment; filename="{name}.{fmt}"',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor, Content-Disposition'
+    }
+    if state.get('last'):
+        headers['X-Next-Cursor'] = encode_cursor([state['last'][key] for key in keys])
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': body,
+        'isBase64Encoded': False
+    }
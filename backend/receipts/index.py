@@ -1,18 +1,331 @@
+import hashlib
 import json
 import os
-from datetime import datetime
+import time
+import uuid
 
 try:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
+    from psycopg2.extras import RealDictCursor, execute_values
 except ImportError:
-    import psycopg2_binary as psycopg2
-    from psycopg2_binary.extras import RealDictCursor
+    from psycopg2_binary.extras import RealDictCursor, execute_values
+
+from cache import TTLCache
+from db import get_connection, release_connection
+from encoder import encode, fetch_dicts, json_cursor
+from export import export_filters, export_request, export_response
+from metrics import dumps, instrumented, register_stats
+from pagination import page_request, split_page
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
 SCHEMA = os.environ.get('MAIN_DB_SCHEMA', 'public')
+RECEIPT_PAGE_KEYS = ('created_at', 'id')
+CATALOG_KEYS_CACHE_SIZE = 5000
+RECEIPT_BATCH_SIZE = int(os.environ.get('RECEIPT_BATCH_SIZE', '20'))
+RECEIPT_MAX_ATTEMPTS = int(os.environ.get('RECEIPT_MAX_ATTEMPTS', '5'))
+RECEIPT_RETRY_SECONDS = int(os.environ.get('RECEIPT_RETRY_SECONDS', '30'))
+RECEIPT_LEASE_SECONDS = int(os.environ.get('RECEIPT_LEASE_SECONDS', '300'))
+RECEIPT_DRAIN_SECONDS = float(os.environ.get('RECEIPT_DRAIN_SECONDS', '20'))
+# Фискальные реквизиты из QR-кода ФНС, однозначно определяющие чек
+QR_ID_FIELDS = ('fn', 'i', 'fp')
+RECEIPT_SUMMARY = 'id, qr_code, status, items_count, created_at'
+# Колонки списка чеков: без payload (исходные позиции) и служебных ключей дедупликации
+RECEIPT_LIST_COLUMNS = '''id, qr_code, receipt_date, store_name, total_amount, is_distributed, status,
+    items_count, attempts, last_error, processed_at, created_at'''
+# Ошибки в данных чека повтор не исправит — такой чек сразу помечается failed
+PAYLOAD_ERRORS = (ValueError, TypeError, KeyError, AttributeError)
+
+reference_cache = TTLCache()
+catalog_keys = TTLCache(max_size=CATALOG_KEYS_CACHE_SIZE)
+register_stats('reference_cache', reference_cache.stats)
+register_stats('catalog_keys', catalog_keys.stats)
+
+
+def load_expense_categories(cur) -> dict:
+    '''Категории расходов: имя в нижнем регистре → id'''
+    cur.execute(f"SELECT id, name FROM {SCHEMA}.budget_categories WHERE type = 'expense'")
+    return {cat['name'].lower(): cat['id'] for cat in cur.fetchall()}
+
+
+def normalize_items(items_data: list, expense_categories: dict, default_category_id) -> list:
+    '''Приводит позиции чека к единому виду: ключ имени, суммы и категория бюджета'''
+    items = []
+    for item in items_data:
+        item_name = item.get('name', '')
+        item_price = float(item.get('price', 0))
+        item_quantity = float(item.get('quantity', 1))
+        category_name = item.get('budget_category_name', 'Продукты')
+        items.append({
+            'name': item_name,
+            'key': item_name.strip(' ').lower(),  # как name_key = LOWER(TRIM(name))
+            'price': item_price,
+            'quantity': item_quantity,
+            'total': float(item.get('total', item_price * item_quantity)),
+            'category_name': category_name,
+            'category_id': expense_categories.get(category_name.lower(), default_category_id)
+        })
+    return items
+
+
+def save_receipt_items(cur, receipt_id, items: list) -> list:
+    '''Записывает позиции чека не более чем тремя запросами; возвращает ключи имён из справочника'''
+    catalog_rows = {}
+    purchased_counts = {}
+    for item in items:
+        catalog_rows.setdefault(item['key'], (item['key'], item['name'], item['category_name']))
+        purchased_counts[item['key']] = purchased_counts.get(item['key'], 0) + 1
+
+    # Имена, уже виденные этим экземпляром функции, в справочник не отправляем
+    unknown_rows = [row for key, row in catalog_rows.items() if not catalog_keys.get(key)[0]]
+    if unknown_rows:
+        execute_values(
+            cur,
+            f'''INSERT INTO {SCHEMA}.product_catalog (name, category, default_unit)
+                SELECT v.name, v.category, 'г'
+                FROM (VALUES %s) AS v(key, name, category)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {SCHEMA}.product_catalog pc WHERE pc.name_key = v.key
+                )
+                ON CONFLICT (name) DO NOTHING''',
+            unknown_rows,
+            page_size=len(unknown_rows)
+        )
+
+    execute_values(
+        cur,
+        f'''INSERT INTO {SCHEMA}.receipt_items 
+            (receipt_id, name, quantity, price, total, budget_category_name, category_id)
+            VALUES %s''',
+        [
+            (receipt_id, item['name'], item['quantity'], item['price'], item['total'],
+             item['category_name'], item['category_id'])
+            for item in items
+        ],
+        page_size=len(items)
+    )
+
+    # Каждая строка чека закрывает одну некупленную позицию с тем же именем
+    execute_values(
+        cur,
+        f'''UPDATE {SCHEMA}.shopping_items si
+            SET is_purchased = TRUE
+            FROM (
+                SELECT s.id, v.count,
+                    ROW_NUMBER() OVER (PARTITION BY v.key ORDER BY s.added_date) AS n
+                FROM {SCHEMA}.shopping_items s
+                JOIN (VALUES %s) AS v(key, count) ON s.name_key = v.key
+                WHERE s.is_purchased = FALSE
+            ) m
+            WHERE si.id = m.id AND m.n <= m.count''',
+        list(purchased_counts.items()),
+        page_size=len(purchased_counts)
+    )
+    return list(catalog_rows)
+
+
+def normalize_qr_code(qr_code: str) -> str:
+    '''Каноническая форма QR-кода: реквизиты fn, i, fp, если они есть, иначе все параметры по алфавиту'''
+    params = {}
+    for part in qr_code.strip().split('&'):
+        key, sep, value = part.partition('=')
+        if sep:
+            value = value.strip().lower()
+            params[key.strip().lower()] = str(int(value)) if value.isdigit() else value
+    if all(params.get(field) for field in QR_ID_FIELDS):
+        return '&'.join(f'{field}={params[field]}' for field in QR_ID_FIELDS)
+    if params:
+        return '&'.join(f'{key}={params[key]}' for key in sorted(params))
+    return qr_code.strip().lower()
+
+
+def qr_code_hash(qr_code):
+    if not isinstance(qr_code, str) or not qr_code.strip():
+        return None
+    return hashlib.sha256(normalize_qr_code(qr_code).encode()).hexdigest()
+
+
+def idempotency_key(event: dict):
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    return (headers.get('idempotency-key') or '').strip()[:255] or None
+
+
+def find_submitted(cur, qr_hash, key):
+    '''Ранее принятый чек с тем же QR-кодом или ключом идемпотентности — один поиск по индексам.
+
+    Совпадение по ключу важнее: иначе повтор ключа с другим QR-кодом нашёл бы чек
+    этого QR-кода и не был бы распознан как конфликт.
+    '''
+    if not qr_hash and not key:
+        return None
+    cur.execute(
+        f'''SELECT {RECEIPT_SUMMARY}, qr_hash, idempotency_key FROM {SCHEMA}.receipts
+            WHERE qr_hash = %s OR idempotency_key = %s
+            ORDER BY (idempotency_key = %s) IS TRUE DESC
+            LIMIT 1''',
+        (qr_hash, key, key)
+    )
+    return cur.fetchone()
+
+
+def key_reused(existing: dict, qr_hash, key) -> bool:
+    '''Ключ идемпотентности уже использован для чека с другим QR-кодом'''
+    return bool(key) and existing['idempotency_key'] == key and existing['qr_hash'] != qr_hash
+
+
+def key_conflict() -> dict:
+    '''Ответ 409 на повтор ключа идемпотентности с другим чеком'''
+    return {
+        'statusCode': 409,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': dumps({'error': 'Idempotency-Key was used for a different receipt'}),
+        'isBase64Encoded': False
+    }
+
+
+def receipt_accepted(receipt: dict, replayed: bool = False) -> dict:
+    '''Ответ 202 на приём чека; повтор отдаёт исходный чек с заголовком Idempotent-Replayed'''
+    headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+    if replayed:
+        headers.update({'Idempotent-Replayed': 'true', 'Access-Control-Expose-Headers': 'Idempotent-Replayed'})
+    return {
+        'statusCode': 202,
+        'headers': headers,
+        'body': dumps({'receipt': dict(receipt), 'items_count': receipt['items_count']}, default=str),
+        'isBase64Encoded': False
+    }
+
+
+def process_receipt(cur, receipt: dict) -> list:
+    '''Разбирает сохранённый чек: позиции, справочник, покупки и расход в бюджете'''
+    expense_categories = reference_cache.get_or_load('expense_categories', lambda: load_expense_categories(cur))
+    default_category_id = expense_categories.get('продукты')
+
+    payload = receipt['payload'] or {}
+    items = normalize_items(payload.get('items', []), expense_categories, default_category_id)
+    total_amount = sum(item['total'] for item in items)
+
+    catalog_written = save_receipt_items(cur, receipt['id'], items) if items else []
+
+    cur.execute(
+        f'''INSERT INTO {SCHEMA}.transactions (type, amount, category_id, description, receipt_id, date)
+            VALUES ('expense', %s, %s, %s, %s, %s)''',
+        (total_amount, default_category_id, f'Чек от {receipt["created_at"].strftime("%d.%m.%Y")}',
+         receipt['id'], receipt['created_at'].date())
+    )
+    cur.execute(
+        f'''UPDATE {SCHEMA}.receipts
+            SET status = 'processed', total_amount = %s, processed_at = CURRENT_TIMESTAMP, last_error = NULL
+            WHERE id = %s''',
+        (total_amount, receipt['id'])
+    )
+    return catalog_written
+
+
+def record_failure(cur, receipt: dict, error: Exception) -> bool:
+    '''Откладывает повтор с экспоненциальной задержкой или помечает чек failed; True — больше не повторять'''
+    attempts = receipt['attempts'] + 1
+    failed = isinstance(error, PAYLOAD_ERRORS) or attempts >= RECEIPT_MAX_ATTEMPTS
+    cur.execute(
+        f'''UPDATE {SCHEMA}.receipts
+            SET attempts = %s, last_error = %s, status = %s,
+                next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id = %s''',
+        (attempts, f'{type(error).__name__}: {error}'[:500], 'failed' if failed else 'pending',
+         RECEIPT_RETRY_SECONDS * 2 ** (attempts - 1), receipt['id'])
+    )
+    return failed
+
+
+def claim_batch(conn, cur) -> list:
+    '''Арендует пачку готовых к обработке чеков и сразу фиксирует аренду.
+
+    FOR UPDATE SKIP LOCKED позволяет нескольким обработчикам разбирать очередь
+    параллельно, не дожидаясь друг друга; сдвиг next_attempt_at на срок аренды
+    не даёт другим взять те же чеки, а после сбоя обработчика возвращает их в очередь.
+    '''
+    cur.execute(
+        f'''UPDATE {SCHEMA}.receipts SET next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id IN (
+                SELECT id FROM {SCHEMA}.receipts
+                WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+                ORDER BY next_attempt_at, created_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id''',
+        (RECEIPT_LEASE_SECONDS, RECEIPT_BATCH_SIZE)
+    )
+    claimed = [row['id'] for row in cur.fetchall()]
+    conn.commit()
+    return claimed
+
+
+def process_claimed(conn, cur, receipt_id) -> str:
+    '''Обрабатывает арендованный чек в отдельной короткой транзакции; возвращает исход'''
+    cur.execute(
+        f'''SELECT id, payload, attempts, created_at FROM {SCHEMA}.receipts
+            WHERE id = %s AND status = 'pending'
+            FOR UPDATE''',
+        (receipt_id,)
+    )
+    receipt = cur.fetchone()
+    if not receipt:
+        # Аренда истекла, и чек уже обработал другой обработчик
+        conn.rollback()
+        return 'skipped'
+    try:
+        catalog_written = process_receipt(cur, receipt)
+        conn.commit()
+    except Exception as error:
+        conn.rollback()
+        failed = record_failure(cur, receipt, error)
+        conn.commit()
+        return 'failed' if failed else 'retried'
+    for key in catalog_written:
+        catalog_keys.put(key, True)
+    return 'processed'
+
+
+def process_batch(conn, cur) -> dict:
+    '''Арендует пачку чеков и обрабатывает каждый отдельно'''
+    claimed = claim_batch(conn, cur)
+    counts = {'claimed': len(claimed), 'processed': 0, 'retried': 0, 'failed': 0, 'skipped': 0}
+    for claimed_id in claimed:
+        counts[process_claimed(conn, cur, claimed_id)] += 1
+    return counts
 
 
+def drain_queue(conn, cur) -> dict:
+    '''Обрабатывает очередь пачками, пока она не опустеет или не выйдет отведённое время'''
+    totals = {'claimed': 0, 'processed': 0, 'retried': 0, 'failed': 0, 'skipped': 0, 'batches': 0}
+    deadline = time.monotonic() + RECEIPT_DRAIN_SECONDS
+    while time.monotonic() < deadline:
+        counts = process_batch(conn, cur)
+        for key, value in counts.items():
+            totals[key] += value
+        totals['batches'] += 1
+        if counts['claimed'] < RECEIPT_BATCH_SIZE:
+            break
+    return totals
+
+
+def is_uuid(value) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+def receipt_status(cur, receipt_id: str):
+    cur.execute(
+        f'''SELECT id, status, qr_code, items_count, total_amount, attempts, last_error,
+                next_attempt_at, processed_at, created_at
+            FROM {SCHEMA}.receipts WHERE id = %s''',
+        (receipt_id,)
+    )
+    return cur.fetchone()
+
+
+@instrumented
 def handler(event: dict, context) -> dict:
     '''API для обработки чеков и добавления в бюджет'''
     method = event.get('httpMethod', 'GET')
@@ -23,129 +336,180 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, Idempotency-Key'
             },
             'body': '',
             'isBase64Encoded': False
         }
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
+        query_params = event.get('queryStringParameters', {}) or {}
+
+        if method == 'GET' and query_params.get('action') == 'export':
+            try:
+                fmt, date_from, date_to, after = export_request(query_params, len(RECEIPT_PAGE_KEYS))
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Invalid export parameters'}),
+                    'isBase64Encoded': False
+                }
+            where, params = export_filters('created_at', ('created_at', 'id'), date_from, date_to, after)
+            return export_response(
+                conn,
+                f'''SELECT id, created_at, receipt_date, qr_code, store_name, total_amount, status,
+                        items_count, processed_at
+                    FROM {SCHEMA}.receipts
+                    {where}
+                    ORDER BY created_at, id''',
+                params, fmt, after is None, 'receipts', RECEIPT_PAGE_KEYS
+            )
+
+        if method == 'GET' and query_params.get('id'):
+            receipt_id = query_params['id']
+            if not is_uuid(receipt_id):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Invalid receipt ID'}),
+                    'isBase64Encoded': False
+                }
+            # Только чтение: обработку с задержками повторов и порядком очереди делает action=process
+            receipt = receipt_status(cur, receipt_id)
+            if not receipt:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Receipt not found'}),
+                    'isBase64Encoded': False
+                }
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': dumps(dict(receipt), default=str),
+                'isBase64Encoded': False
+            }
+
         if method == 'GET':
-            cur.execute(f'SELECT * FROM {SCHEMA}.receipts')
-            receipts = cur.fetchall()
+            try:
+                page_size, after = page_request(query_params, len(RECEIPT_PAGE_KEYS))
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Invalid cursor'}),
+                    'isBase64Encoded': False
+                }
+
+            if not page_size:
+                with json_cursor(conn) as list_cur:
+                    list_cur.execute(f'SELECT {RECEIPT_LIST_COLUMNS} FROM {SCHEMA}.receipts')
+                    receipts = fetch_dicts(list_cur)
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': encode(receipts),
+                    'isBase64Encoded': False
+                }
+
+            where = ''
+            params = []
+            if after:
+                where = 'WHERE (created_at, id) < (%s, %s)'
+                params.extend(after)
+            with json_cursor(conn) as list_cur:
+                list_cur.execute(
+                    f'''SELECT {RECEIPT_LIST_COLUMNS} FROM {SCHEMA}.receipts {where}
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s''',
+                    params + [page_size + 1]
+                )
+                receipts, next_cursor = split_page(fetch_dicts(list_cur), page_size, RECEIPT_PAGE_KEYS)
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': encode({
+                    'receipts': receipts,
+                    'next_cursor': next_cursor
+                }),
+                'isBase64Encoded': False
+            }
+
+        elif method == 'POST' and query_params.get('action') == 'process':
+            totals = drain_queue(conn, cur)
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([dict(r) for r in receipts], default=str),
+                'body': dumps(totals),
                 'isBase64Encoded': False
             }
 
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
+            items_data = body.get('items', []) if isinstance(body, dict) else None
+            if not isinstance(items_data, list):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Items must be a list'}),
+                    'isBase64Encoded': False
+                }
             
-            cur.execute(
-                f'''INSERT INTO {SCHEMA}.receipts (qr_code, total_amount, status)
-                    VALUES (%s, %s, 'pending') RETURNING *''',
-                (body.get('qr_code'), body.get('total_amount'))
-            )
-            receipt = cur.fetchone()
-            receipt_id = receipt['id']
+            qr_hash = qr_code_hash(body.get('qr_code'))
+            key = idempotency_key(event)
+            existing = find_submitted(cur, qr_hash, key)
+            if existing and key_reused(existing, qr_hash, key):
+                return key_conflict()
+            if existing:
+                existing.pop('qr_hash')
+                existing.pop('idempotency_key')
+            if existing and existing['status'] != 'failed':
+                return receipt_accepted(existing, replayed=True)
             
-            total_amount = 0
-            items_data = body.get('items', [])
-            
-            cur.execute(f'SELECT id, name FROM {SCHEMA}.budget_categories WHERE type = ''expense''')
-            expense_categories = {cat['name'].lower(): cat['id'] for cat in cur.fetchall()}
-            
-            default_category_id = expense_categories.get('продукты')
-            
-            for item in items_data:
-                item_name = item.get('name', '')
-                item_price = float(item.get('price', 0))
-                item_quantity = float(item.get('quantity', 1))
-                item_total = float(item.get('total', item_price * item_quantity))
-                
-                total_amount += item_total
-                
-                category_name = item.get('budget_category_name', 'Продукты')
-                category_id = expense_categories.get(category_name.lower(), default_category_id)
-                
-                cur.execute(
-                    f'''SELECT id, calories_per_100g FROM {SCHEMA}.product_catalog 
-                        WHERE LOWER(TRIM(name)) = LOWER(TRIM(%s))
-                        LIMIT 1''',
-                    (item_name,)
-                )
-                catalog_item = cur.fetchone()
-                
-                if not catalog_item:
-                    cur.execute(
-                        f'''INSERT INTO {SCHEMA}.product_catalog (name, category, default_unit)
-                            VALUES (%s, %s, 'г')
-                            RETURNING id, calories_per_100g''',
-                        (item_name, category_name)
-                    )
-                    catalog_item = cur.fetchone()
-                
+            if existing:
+                # Повторная отправка чека, который не удалось обработать, ставит его в очередь заново
                 cur.execute(
-                    f'''INSERT INTO {SCHEMA}.receipt_items 
-                        (receipt_id, name, quantity, price, total, budget_category_name, category_id)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)''',
-                    (receipt_id, item_name, item_quantity, item_price, item_total, 
-                     category_name, category_id)
+                    f'''UPDATE {SCHEMA}.receipts
+                        SET payload = %s, items_count = %s, status = 'pending', attempts = 0,
+                            last_error = NULL, next_attempt_at = CURRENT_TIMESTAMP,
+                            idempotency_key = COALESCE(%s, idempotency_key)
+                        WHERE id = %s AND status = 'failed'
+                        RETURNING {RECEIPT_SUMMARY}''',
+                    (json.dumps(body, ensure_ascii=False), len(items_data), key, existing['id'])
                 )
-                
+            else:
                 cur.execute(
-                    f'''SELECT id FROM {SCHEMA}.shopping_items 
-                        WHERE LOWER(TRIM(name)) = LOWER(TRIM(%s)) 
-                        AND is_purchased = FALSE
-                        LIMIT 1''',
-                    (item_name,)
+                    f'''INSERT INTO {SCHEMA}.receipts (qr_code, status, payload, items_count, qr_hash, idempotency_key)
+                        VALUES (%s, 'pending', %s, %s, %s, %s)
+                        ON CONFLICT DO NOTHING
+                        RETURNING {RECEIPT_SUMMARY}''',
+                    (body.get('qr_code'), json.dumps(body, ensure_ascii=False), len(items_data), qr_hash, key)
                 )
-                matching_shopping_item = cur.fetchone()
-                
-                if matching_shopping_item:
-                    cur.execute(
-                        f'''UPDATE {SCHEMA}.shopping_items 
-                            SET is_purchased = TRUE 
-                            WHERE id = %s''',
-                        (matching_shopping_item['id'],)
-                    )
-            
-            cur.execute(
-                f'UPDATE {SCHEMA}.receipts SET total_amount = %s, status = ''processed'' WHERE id = %s',
-                (total_amount, receipt_id)
-            )
-            
-            cur.execute(
-                f'''INSERT INTO {SCHEMA}.transactions (type, amount, category_id, description, receipt_id, date)
-                    VALUES ('expense', %s, %s, %s, %s, CURRENT_DATE)''',
-                (total_amount, default_category_id, f'Чек от {datetime.now().strftime("%d.%m.%Y")}', receipt_id)
-            )
-            
+            receipt = cur.fetchone()
             conn.commit()
+            if not receipt:
+                # Параллельный повтор успел вставить чек или заново поставить его в очередь
+                # между поиском и записью
+                receipt = find_submitted(cur, qr_hash, key)
+                if key_reused(receipt, qr_hash, key):
+                    return key_conflict()
+                receipt.pop('qr_hash')
+                receipt.pop('idempotency_key')
+                return receipt_accepted(receipt, replayed=True)
             
-            return {
-                'statusCode': 201,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'receipt': dict(receipt),
-                    'total_amount': total_amount,
-                    'items_count': len(items_data)
-                }, default=str),
-                'isBase64Encoded': False
-            }
+            return receipt_accepted(receipt)
 
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': dumps({'error': 'Method not allowed'}),
             'isBase64Encoded': False
         }
 
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
@@ -0,0 +1,91 @@
+import json
+import time
+
+try:
+    from psycopg2 import extensions
+except ImportError:
+    from psycopg2_binary import extensions
+
+from metrics import current
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson else 'json'
+# Даты и время, оставшиеся в ответе, идут в default, как и у json, — иначе orjson
+# записал бы datetime через «T» и ответ зависел бы от того, установлен ли он
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+# OID типов PostgreSQL
+NUMERIC_OID = 1700
+UUID_OID = 2950
+DATE_OID = 1082
+TIME_OID = 1083
+TIMESTAMP_OID = 1114
+TIMESTAMPTZ_OID = 1184
+
+# uuid, date, time и numeric читаются сразу текстом PostgreSQL — он совпадает с тем,
+# что давал str() от Decimal/date, но без создания объектов Python на каждое значение
+TEXT_TYPE = extensions.new_type((UUID_OID, DATE_OID, TIME_OID), 'JSON_TEXT', extensions.UNICODE)
+NUMERIC_TYPES = {
+    str: extensions.new_type((NUMERIC_OID,), 'NUMERIC_TEXT', extensions.UNICODE),
+    float: extensions.new_type((NUMERIC_OID,), 'NUMERIC_FLOAT', extensions.FLOAT)
+}
+# Метки времени остаются datetime и приводятся str() в fetch_dicts: текст PostgreSQL
+# отличается от str(datetime) в дробных секундах и часовом поясе
+TIMESTAMP_OIDS = (TIMESTAMP_OID, TIMESTAMPTZ_OID)
+
+_layouts = {}
+
+
+def json_cursor(conn, decimal=str):
+    '''Курсор-кортеж для fetch_dicts; numeric отдаётся строкой (decimal=str) или числом (decimal=float)'''
+    cur = conn.cursor(cursor_factory=extensions.cursor)
+    extensions.register_type(TEXT_TYPE, cur)
+    extensions.register_type(NUMERIC_TYPES[decimal], cur)
+    return cur
+
+
+def row_layout(description) -> tuple:
+    '''(имена колонок, индексы меток времени); считается один раз на форму запроса'''
+    key = tuple((column.name, column.type_code) for column in description)
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = _layouts[key] = (
+            tuple(column.name for column in description),
+            tuple(i for i, column in enumerate(description) if column.type_code in TIMESTAMP_OIDS)
+        )
+    return layout
+
+
+def fetch_dicts(cur) -> list:
+    '''Все строки курсора из json_cursor как словари со значениями, готовыми для JSON'''
+    rows = cur.fetchall()
+    columns, timestamps = row_layout(cur.description)
+    if not timestamps:
+        return [dict(zip(columns, row)) for row in rows]
+    result = []
+    for row in rows:
+        values = list(row)
+        for i in timestamps:
+            if values[i] is not None:
+                values[i] = str(values[i])
+        result.append(dict(zip(columns, values)))
+    return result
+
+
+def encode(obj, default=str) -> str:
+    '''JSON ответа: orjson, если установлен, иначе json без пробелов и \\u-экранирования.
+
+    default вызывается только для того, что осталось не JSON-типом (Decimal из
+    обычного курсора и т. п.); строки из fetch_dicts его не задействуют.
+    '''
+    started = time.perf_counter()
+    try:
+        if orjson is not None:
+            return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS).decode()
+        return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':'))
+    finally:
+        current.json_time += time.perf_counter() - started
@@ -1,12 +1,196 @@
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import uuid
+from psycopg2.extras import RealDictCursor, execute_values
+
+from db import get_connection, release_connection
+from encoder import encode, fetch_dicts, json_cursor
+from metrics import dumps, instrumented
+from pagination import page_request, split_page
+from sync import changes_since
+from units import normalize_unit, units_sql
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
 SCHEMA = os.environ.get('MAIN_DB_SCHEMA', 'public')
+SHOPPING_PAGE_KEYS = ('is_purchased', 'added_date', 'id')
+SYNC_TABLES = ('shopping_items',)
+BATCH_OPERATIONS = ('purchase', 'quantity', 'delete', 'move')
+MAX_BATCH_SIZE = 500
+
+
+def is_uuid(value) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+def canonical_id(value):
+    '''UUID в каноническом виде, как его возвращает БД; иначе значение как есть'''
+    return str(uuid.UUID(str(value))) if is_uuid(value) else value
 
 
+def validate_operations(cur, operations: list) -> dict:
+    '''Проверяет операции пакета; возвращает ошибки по индексам операций'''
+    errors = {}
+    seen = set()
+    locations = set()
+    for index, op in enumerate(operations):
+        kind = op.get('op')
+        item_id = op.get('id')
+        if kind not in BATCH_OPERATIONS:
+            errors[index] = 'Unknown operation'
+        elif not is_uuid(item_id):
+            errors[index] = 'Invalid item ID'
+        elif item_id in seen:
+            errors[index] = 'Duplicate item in batch'
+        elif kind == 'quantity' and (isinstance(op.get('quantity'), bool)
+                                     or not isinstance(op.get('quantity'), (int, float))):
+            errors[index] = 'Quantity must be a number'
+        elif kind == 'move' and not op.get('storageLocationId'):
+            errors[index] = 'Storage location required'
+        elif op.get('storageLocationId') and not is_uuid(op['storageLocationId']):
+            errors[index] = 'Invalid storage location ID'
+        else:
+            seen.add(item_id)
+            if op.get('storageLocationId'):
+                locations.add(canonical_id(op['storageLocationId']))
+
+    if locations:
+        cur.execute(
+            f'SELECT id::text AS id FROM {SCHEMA}.storage_locations WHERE id = ANY(%s::uuid[])',
+            (list(locations),)
+        )
+        existing = {row['id'] for row in cur.fetchall()}
+        for index, op in enumerate(operations):
+            if (index not in errors and op.get('storageLocationId')
+                    and canonical_id(op['storageLocationId']) not in existing):
+                errors[index] = 'Storage location not found'
+    return errors
+
+
+def stock_products(cur, lines: list):
+    '''Добавляет купленное в запасы одним запросом: дополняет имеющийся продукт или создаёт новый.
+
+    Количества суммируются в базовых единицах своей величины (г, мл, шт) и
+    добавляются только к продукту той же величины с пересчётом в его единицу;
+    граммы к штукам не прибавляются — для них заводится отдельная строка.
+    '''
+    execute_values(
+        cur,
+        f'''WITH units(unit, dimension, factor) AS ({units_sql()}),
+            v(name, quantity, unit, category, location) AS (VALUES %s),
+            lines AS (
+                SELECT LOWER(TRIM(v.name)) AS key, v.location::uuid AS location,
+                    COALESCE(u.dimension, LOWER(TRIM(v.unit))) AS dimension,
+                    MIN(v.name) AS name, SUM(v.quantity::numeric * COALESCE(u.factor, 1)) AS quantity,
+                    MIN(v.unit) AS unit, MIN(v.category) AS category
+                FROM v
+                LEFT JOIN units u ON u.unit = LOWER(TRIM(v.unit))
+                GROUP BY 1, 2, 3
+            ),
+            targets AS (
+                SELECT DISTINCT ON (l.key, l.location, l.dimension)
+                    p.id, l.key, l.location, l.dimension, COALESCE(u.factor, 1) AS factor
+                FROM lines l
+                JOIN {SCHEMA}.products p ON p.name_key = l.key AND p.storage_location_id = l.location
+                LEFT JOIN units u ON u.unit = LOWER(TRIM(p.unit))
+                WHERE COALESCE(u.dimension, LOWER(TRIM(p.unit))) = l.dimension
+                ORDER BY l.key, l.location, l.dimension, p.id
+            ),
+            updated AS (
+                UPDATE {SCHEMA}.products p
+                SET quantity = p.quantity + l.quantity / t.factor
+                FROM targets t JOIN lines l USING (key, location, dimension)
+                WHERE p.id = t.id
+                RETURNING p.id
+            )
+            INSERT INTO {SCHEMA}.products (name, quantity, unit, category, storage_location_id, notes)
+            SELECT l.name, l.quantity / COALESCE(u.factor, 1), l.unit, l.category, l.location,
+                'Добавлено из списка покупок'
+            FROM lines l
+            LEFT JOIN units u ON u.unit = LOWER(TRIM(l.unit))
+            WHERE NOT EXISTS (
+                SELECT 1 FROM targets t
+                WHERE t.key = l.key AND t.location = l.location AND t.dimension = l.dimension
+            )''',
+        lines,
+        page_size=len(lines)
+    )
+
+
+def apply_batch(cur, operations: list) -> list:
+    '''Выполняет пакет операций над списком покупок запросами на группу, а не на позицию'''
+    operations = [op if isinstance(op, dict) else {} for op in operations]
+    operations = [{**op, 'id': canonical_id(op.get('id'))} for op in operations]
+    errors = validate_operations(cur, operations)
+    results = [{'index': i, 'id': op.get('id'), 'op': op.get('op')} for i, op in enumerate(operations)]
+    valid = [(i, op) for i, op in enumerate(operations) if i not in errors]
+    by_kind = {kind: [(i, op) for i, op in valid if op['op'] == kind] for kind in BATCH_OPERATIONS}
+    changed = {}
+    stock_lines = []
+
+    if by_kind['quantity']:
+        execute_values(
+            cur,
+            f'''UPDATE {SCHEMA}.shopping_items s SET quantity = v.quantity::numeric
+                FROM (VALUES %s) AS v(id, quantity)
+                WHERE s.id = v.id::uuid
+                RETURNING s.*''',
+            [(op['id'], op['quantity']) for _, op in by_kind['quantity']],
+            page_size=len(by_kind['quantity'])
+        )
+        changed.update({str(row['id']): dict(row) for row in cur.fetchall()})
+
+    if by_kind['purchase']:
+        execute_values(
+            cur,
+            f'''UPDATE {SCHEMA}.shopping_items s SET is_purchased = v.purchased
+                FROM (VALUES %s) AS v(id, purchased, location), {SCHEMA}.shopping_items old
+                WHERE s.id = v.id::uuid AND old.id = s.id
+                RETURNING s.*, old.is_purchased AS was_purchased, v.location''',
+            [(op['id'], op.get('isPurchased', True) is not False, op.get('storageLocationId'))
+             for _, op in by_kind['purchase']],
+            page_size=len(by_kind['purchase'])
+        )
+        for row in cur.fetchall():
+            row = dict(row)
+            was_purchased = row.pop('was_purchased')
+            location = row.pop('location')
+            if row['is_purchased'] and not was_purchased and location:
+                stock_lines.append((row['name'], row['quantity'], row['unit'], row['category'], location))
+            changed[str(row['id'])] = row
+
+    removals = by_kind['delete'] + by_kind['move']
+    if removals:
+        move_locations = {op['id']: op['storageLocationId'] for _, op in by_kind['move']}
+        cur.execute(
+            f'DELETE FROM {SCHEMA}.shopping_items WHERE id = ANY(%s::uuid[]) RETURNING *',
+            ([op['id'] for _, op in removals],)
+        )
+        for row in cur.fetchall():
+            row = dict(row)
+            location = move_locations.get(str(row['id']))
+            if location:
+                stock_lines.append((row['name'], row['quantity'], row['unit'], row['category'], location))
+            changed[str(row['id'])] = row
+
+    if stock_lines:
+        stock_products(cur, stock_lines)
+
+    for result in results:
+        if result['index'] in errors:
+            result.update({'status': 'error', 'error': errors[result['index']]})
+        elif result['id'] in changed:
+            result['status'] = 'ok'
+            if result['op'] in ('purchase', 'quantity'):
+                result['item'] = changed[result['id']]
+        else:
+            result['status'] = 'not_found'
+    return results
+
+
+@instrumented
 def handler(event: dict, context) -> dict:
     '''API для управления списком покупок'''
     method = event.get('httpMethod', 'GET')
@@ -23,13 +207,68 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
         if method == 'GET':
-            cur.execute(f'SELECT * FROM {SCHEMA}.shopping_items ORDER BY is_purchased ASC, added_date DESC')
-            items = cur.fetchall()
+            query_params = event.get('queryStringParameters', {}) or {}
+            if 'since' in query_params:
+                try:
+                    result = changes_since(cur, SCHEMA, query_params['since'], SYNC_TABLES)
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': 'Invalid sync token'}),
+                        'isBase64Encoded': False
+                    }
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps(result, default=str),
+                    'isBase64Encoded': False
+                }
+
+            try:
+                page_size, after = page_request(query_params, len(SHOPPING_PAGE_KEYS))
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': 'Invalid cursor'}),
+                    'isBase64Encoded': False
+                }
+
+            if not page_size:
+                with json_cursor(conn) as list_cur:
+                    list_cur.execute(f'SELECT * FROM {SCHEMA}.shopping_items ORDER BY is_purchased ASC, added_date DESC')
+                    items = fetch_dicts(list_cur)
+
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': encode(items),
+                    'isBase64Encoded': False
+                }
+
+            where = ''
+            params = []
+            if after:
+                where = '''WHERE is_purchased > %s
+                    OR (is_purchased = %s AND (added_date, id) < (%s, %s))'''
+                params.extend([after[0], after[0], after[1], after[2]])
+            with json_cursor(conn) as list_cur:
+                list_cur.execute(
+                    f'''SELECT * FROM {SCHEMA}.shopping_items {where}
+                        ORDER BY is_purchased ASC, added_date DESC, id DESC
+                        LIMIT %s''',
+                    params + [page_size + 1]
+                )
+                items, next_cursor = split_page(fetch_dicts(list_cur), page_size, SHOPPING_PAGE_KEYS)
 
             return {
                 'statusCode': 200,
@@ -37,13 +276,40 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps([dict(item) for item in items], default=str),
+                'body': encode({
+                    'items': items,
+                    'next_cursor': next_cursor
+                }),
                 'isBase64Encoded': False
             }
 
         elif method == 'POST':
+            query_params = event.get('queryStringParameters', {}) or {}
             body = json.loads(event.get('body', '{}'))
 
+            if query_params.get('action') == 'batch':
+                operations = body.get('operations')
+                if not isinstance(operations, list) or not operations or len(operations) > MAX_BATCH_SIZE:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': f'operations must be a list of 1 to {MAX_BATCH_SIZE} items'}),
+                        'isBase64Encoded': False
+                    }
+
+                results = apply_batch(cur, operations)
+                conn.commit()
+
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({
+                        'results': results,
+                        'applied': sum(1 for r in results if r['status'] == 'ok')
+                    }, default=str),
+                    'isBase64Encoded': False
+                }
+
             cur.execute(
                 f'''INSERT INTO {SCHEMA}.shopping_items 
                     (name, quantity, unit, category, notes)
@@ -52,7 +318,7 @@ def handler(event: dict, context) -> dict:
                 (
                     body.get('name'),
                     body.get('quantity'),
-                    body.get('unit'),
+                    normalize_unit(body.get('unit')),
                     body.get('category'),
                     body.get('notes')
                 )
@@ -66,7 +332,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(dict(item), default=str),
+                'body': dumps(dict(item), default=str),
                 'isBase64Encoded': False
             }
 
@@ -79,7 +345,7 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Item ID required'}),
+                    'body': dumps({'error': 'Item ID required'}),
                     'isBase64Encoded': False
                 }
 
@@ -96,7 +362,7 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 404,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Item not found'}),
+                    'body': dumps({'error': 'Item not found'}),
                     'isBase64Encoded': False
                 }
             
@@ -107,36 +373,10 @@ def handler(event: dict, context) -> dict:
             item = cur.fetchone()
             
             if is_purchased and not old_item['is_purchased'] and storage_location_id:
-                cur.execute(
-                    f'''SELECT id FROM {SCHEMA}.products 
-                        WHERE LOWER(TRIM(name)) = LOWER(TRIM(%s)) 
-                        AND storage_location_id = %s
-                        LIMIT 1''',
-                    (item['name'], storage_location_id)
+                stock_products(
+                    cur,
+                    [(item['name'], item['quantity'], item['unit'], item['category'], storage_location_id)]
                 )
-                existing_product = cur.fetchone()
-                
-                if existing_product:
-                    cur.execute(
-                        f'''UPDATE {SCHEMA}.products 
-                            SET quantity = quantity + %s 
-                            WHERE id = %s''',
-                        (item['quantity'], existing_product['id'])
-                    )
-                else:
-                    cur.execute(
-                        f'''INSERT INTO {SCHEMA}.products 
-                            (name, quantity, unit, category, storage_location_id, notes)
-                            VALUES (%s, %s, %s, %s, %s, %s)''',
-                        (
-                            item['name'],
-                            item['quantity'],
-                            item['unit'],
-                            item['category'],
-                            storage_location_id,
-                            'Добавлено из списка покупок'
-                        )
-                    )
             
             conn.commit()
 
@@ -146,7 +386,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(dict(item), default=str),
+                'body': dumps(dict(item), default=str),
                 'isBase64Encoded': False
             }
 
@@ -158,7 +398,7 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Item ID required'}),
+                    'body': dumps({'error': 'Item ID required'}),
                     'isBase64Encoded': False
                 }
 
@@ -175,10 +415,10 @@ def handler(event: dict, context) -> dict:
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': dumps({'error': 'Method not allowed'}),
             'isBase64Encoded': False
         }
 
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
@@ -0,0 +1,38 @@
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values: list) -> str:
+    '''Непрозрачный курсор из значений ключа сортировки последней строки страницы'''
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, key_count: int) -> list:
+    '''Разбирает курсор; ValueError, если он повреждён или от другого списка'''
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list) or len(values) != key_count:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def page_request(query_params: dict, key_count: int):
+    '''Размер страницы и позиция курсора; (None, None), если клиент ждёт весь список'''
+    limit = query_params.get('limit')
+    cursor = query_params.get('cursor')
+    if limit is None and cursor is None:
+        return None, None
+    size = min(max(int(limit or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    return size, decode_cursor(cursor, key_count) if cursor else None
+
+
+def split_page(rows: list, size: int, keys: tuple):
+    '''Отрезает строку-разведчик и возвращает (страница, курсор следующей страницы)'''
+    if len(rows) <= size:
+        return rows, None
+    page = rows[:size]
+    return page, encode_cursor([page[-1][key] for key in keys])
@@ -0,0 +1,323 @@
+import base64
+import csv
+import io
+import json
+import os
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from units import normalize_unit
+
+MAX_IMPORT_ROWS = int(os.environ.get('MAX_IMPORT_ROWS', '100000'))
+# Сколько отклонённых строк перечислять в ответе; в счётчик rejected входят все
+IMPORT_ERRORS_SHOWN = 100
+
+INT4_MAX = 2 ** 31 - 1
+
+# Колонки файла: (колонка, принимаемые заголовки, тип, ограничение, обязательная).
+# Ограничение — как у колонки в БД: длина VARCHAR, максимум INTEGER или
+# (точность, масштаб) DECIMAL, чтобы строка, не влезающая в колонку, отклонялась
+# сама, а не роняла COPY или слияние всего файла
+IMPORT_FIELDS = {
+    'catalog': (
+        ('name', ('name', 'название'), 'text', 200, True),
+        ('category', ('category', 'категория'), 'text', 100, False),
+        ('calories_per_100g', ('calories_per_100g', 'caloriesper100g', 'calories', 'kcal'), 'int', INT4_MAX, False),
+        ('default_unit', ('default_unit', 'defaultunit', 'unit'), 'unit', 20, False),
+        ('density', ('density',), 'positive', (8, 3), False),
+        ('piece_weight', ('piece_weight', 'pieceweight'), 'positive', (10, 2), False)
+    ),
+    'products': (
+        ('name', ('name', 'название'), 'text', 200, True),
+        ('quantity', ('quantity', 'количество'), 'number', (10, 2), True),
+        ('unit', ('unit', 'единица'), 'unit', 20, True),
+        ('storage_location_id', ('location', 'storage_location_id', 'storagelocationid', 'storage_location'),
+         'text', None, True),
+        ('category', ('category', 'категория'), 'text', 100, False),
+        ('expiry_date', ('expiry_date', 'expirydate'), 'date', None, False),
+        ('notes', ('notes',), 'text', None, False),
+        ('price', ('price',), 'number', (10, 2), False),
+        ('calories_per_100g', ('calories_per_100g', 'caloriesper100g', 'calories'), 'int', INT4_MAX, False)
+    )
+}
+
+STAGING_TYPES = {
+    'text': 'TEXT', 'unit': 'TEXT', 'int': 'INTEGER', 'number': 'NUMERIC', 'positive': 'NUMERIC', 'date': 'DATE'
+}
+
+
+def import_request(event: dict) -> tuple:
+    '''(цель, формат, текст) из target=catalog|products, format=csv|ndjson и тела; ValueError при ошибке.
+
+    Формат по умолчанию берётся из Content-Type: application/x-ndjson — NDJSON, иначе CSV.
+    '''
+    query_params = event.get('queryStringParameters', {}) or {}
+    target = query_params.get('target', 'catalog')
+    if target not in IMPORT_FIELDS:
+        raise ValueError('Unknown import target')
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    fmt = query_params.get('format') or ('ndjson' if 'ndjson' in headers.get('content-type', '') else 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        raise ValueError('Unsupported import format')
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8-sig')
+    return target, fmt, body.lstrip('\ufeff')
+
+
+def read_records(body: str, fmt: str):
+    '''Строки файла как (номер строки, dict или None, если строку не разобрать)'''
+    if fmt == 'ndjson':
+        for line_no, line in enumerate(body.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_no, record if isinstance(record, dict) else None
+        return
+
+    reader = csv.reader(io.StringIO(body))
+    header = next(reader, None)
+    if not header:
+        return
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        yield reader.line_num, dict(zip(header, row))
+
+
+def convert(kind: str, value, limit):
+    '''Значение колонки нужного типа; None для пустого, ValueError для некорректного'''
+    if value is None:
+        return None
+    if isinstance(value, (dict, list, bool)):
+        raise ValueError('wrong type')
+    value = str(value).strip()
+    if not value:
+        return None
+    if kind in ('text', 'unit'):
+        if kind == 'unit':
+            value = normalize_unit(value)
+        if limit and len(value) > limit:
+            raise ValueError(f'longer than {limit} characters')
+        return value
+    if kind == 'date':
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise ValueError('expected YYYY-MM-DD')
+    try:
+        number = Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError('not a number')
+    if not number.is_finite() or number < 0:
+        raise ValueError('must be positive' if kind == 'positive' else 'must not be negative')
+    if kind == 'int':
+        number = int(number.to_integral_value(ROUND_HALF_UP))
+        if number > limit:
+            raise ValueError(f'must be at most {limit}')
+        return number
+    precision, scale = limit
+    # Округление, как при записи в DECIMAL(precision, scale); порядок проверяется
+    # заранее, чтобы quantize не упёрся в точность контекста
+    if number.adjusted() >= precision - scale:
+        raise ValueError(f'must be less than {10 ** (precision - scale)}')
+    number = number.quantize(Decimal(1).scaleb(-scale), ROUND_HALF_UP)
+    if number >= 10 ** (precision - scale):
+        raise ValueError(f'must be less than {10 ** (precision - scale)}')
+    if kind == 'positive' and number == 0:
+        raise ValueError('must be positive')
+    return number
+
+
+def parse_rows(body: str, fmt: str, target: str, locations: dict) -> tuple:
+    '''Проверяет строки файла; (строки для staging, отклонённые строки, всего строк).
+
+    Повтор той же позиции (название в справочнике; место, название и срок годности
+    в инвентаре) отклоняет более раннюю строку — применяется последняя.
+    locations — id и названия мест хранения в нижнем регистре → id.
+    '''
+    fields = IMPORT_FIELDS[target]
+    aliases = {alias: column for column, names, _, _, _ in fields for alias in names}
+    accepted = {}
+    rejected = []
+    total = 0
+
+    for line_no, record in read_records(body, fmt):
+        total += 1
+        if total > MAX_IMPORT_ROWS:
+            raise ValueError(f'Import is limited to {MAX_IMPORT_ROWS} rows')
+        if record is None:
+            rejected.append({'line': line_no, 'error': 'Not a JSON object'})
+            continue
+        raw = {}
+        for key, value in record.items():
+            column = aliases.get(str(key).strip().lower().replace(' ', '_'))
+            if column:
+                raw[column] = value
+
+        row = {}
+        error = None
+        for column, _, kind, limit, required in fields:
+            try:
+                row[column] = convert(kind, raw.get(column), limit)
+            except ValueError as e:
+                error = f'{column}: {e}'
+                break
+            if required and row[column] is None:
+                error = f'{column} is required'
+                break
+        if error is None and target == 'products':
+            location = locations.get(row['storage_location_id'].lower())
+            if location is None:
+                error = 'Storage location not found'
+            elif location == '':
+                error = 'Storage location name is ambiguous'
+            row['storage_location_id'] = location
+        if error:
+            rejected.append({'line': line_no, 'error': error})
+            continue
+
+        if target == 'catalog':
+            key = row['name']
+        else:
+            key = (row['storage_location_id'], row['name'].lower(), row['expiry_date'])
+        if key in accepted:
+            rejected.append({'line': accepted[key][0], 'error': f'Superseded by line {line_no}'})
+        accepted[key] = (line_no, row)
+
+    rows = [
+        [line_no] + [row[column] for column, _, _, _, _ in fields]
+        for line_no, row in sorted(accepted.values(), key=lambda item: item[0])
+    ]
+    return rows, sorted(rejected, key=lambda r: r['line']), total
+
+
+def load_locations(cur, schema: str) -> dict:
+    '''id и названия мест хранения (нижний регистр) → id; '' для названия, общего у нескольких мест'''
+    cur.execute(f'SELECT id::text AS id, name FROM {schema}.storage_locations')
+    locations = {}
+    for location in cur.fetchall():
+        name = location['name'].strip().lower()
+        locations[name] = '' if name in locations and locations[name] != location['id'] else location['id']
+        locations[location['id']] = location['id']
+    return locations
+
+
+def copy_to_staging(cur, target: str, rows: list) -> str:
+    '''Создаёт временную таблицу import_<цель> и загружает в неё строки через COPY'''
+    table = f'import_{target}'
+    fields = IMPORT_FIELDS[target]
+    columns = ', '.join(f'{column} {STAGING_TYPES[kind]}' for column, _, kind, _, _ in fields)
+    cur.execute(f'CREATE TEMP TABLE {table} (line_no INTEGER, {columns}) ON COMMIT DROP')
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        # В CSV-режиме COPY пустое значение без кавычек читает как NULL
+        writer.writerow(['' if value is None else value for value in row])
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {table} (line_no, {', '.join(column for column, _, _, _, _ in fields)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+    return table
+
+
+def merge_catalog(cur, schema: str) -> tuple:
+    '''Сливает import_catalog в справочник по названию; (добавлено, обновлено).
+
+    Пустые необязательные значения не затирают уже заполненные в справочнике;
+    единица 'г' подставляется только новым позициям. Поэтому слияние — это
+    UPDATE и INSERT, как у продуктов: в ON CONFLICT пустая единица из файла
+    была бы уже неотличима от подставленной по умолчанию.
+    '''
+    cur.execute(f'''
+        WITH updated AS (
+            UPDATE {schema}.product_catalog c SET
+                category = COALESCE(s.category, c.category),
+                calories_per_100g = COALESCE(s.calories_per_100g, c.calories_per_100g),
+                default_unit = COALESCE(s.default_unit, c.default_unit),
+                density = COALESCE(s.density, c.density),
+                piece_weight = COALESCE(s.piece_weight, c.piece_weight),
+                updated_at = CURRENT_TIMESTAMP
+            FROM import_catalog s
+            WHERE c.name = s.name
+            RETURNING 1
+        ), inserted AS (
+            INSERT INTO {schema}.product_catalog
+                (name, category, calories_per_100g, default_unit, density, piece_weight)
+            SELECT s.name, s.category, s.calories_per_100g, COALESCE(s.default_unit, 'г'), s.density, s.piece_weight
+            FROM import_catalog s
+            WHERE NOT EXISTS (SELECT 1 FROM {schema}.product_catalog c WHERE c.name = s.name)
+            ON CONFLICT (name) DO NOTHING
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM inserted) AS inserted, (SELECT COUNT(*) FROM updated) AS updated
+    ''')
+    counts = cur.fetchone()
+    return counts['inserted'], counts['updated']
+
+
+def merge_products(cur, schema: str) -> tuple:
+    '''Сливает import_products в инвентарь; (добавлено, обновлено).
+
+    Продукт того же места хранения с тем же названием и сроком годности обновляется:
+    количество и единица заменяются значениями из файла (это инвентаризация),
+    пустые необязательные значения не затирают заполненные. Остальное добавляется.
+    '''
+    cur.execute(f'''
+        WITH updated AS (
+            UPDATE {schema}.products p SET
+                quantity = s.quantity,
+                unit = s.unit,
+                category = COALESCE(s.category, p.category),
+                notes = COALESCE(s.notes, p.notes),
+                price = COALESCE(s.price, p.price),
+                calories_per_100g = COALESCE(s.calories_per_100g, p.calories_per_100g)
+            FROM import_products s
+            WHERE p.storage_location_id = s.storage_location_id::uuid
+              AND p.name_key = LOWER(TRIM(s.name))
+              AND p.expiry_date IS NOT DISTINCT FROM s.expiry_date
+            RETURNING s.line_no
+        ), inserted AS (
+            INSERT INTO {schema}.products
+                (name, quantity, unit, category, expiry_date, storage_location_id, notes, price, calories_per_100g)
+            SELECT s.name, s.quantity, s.unit, s.category, s.expiry_date, s.storage_location_id::uuid,
+                s.notes, s.price, s.calories_per_100g
+            FROM import_products s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {schema}.products p
+                WHERE p.storage_location_id = s.storage_location_id::uuid
+                  AND p.name_key = LOWER(TRIM(s.name))
+                  AND p.expiry_date IS NOT DISTINCT FROM s.expiry_date
+            )
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM inserted) AS inserted, (SELECT COUNT(DISTINCT line_no) FROM updated) AS updated
+    ''')
+    counts = cur.fetchone()
+    return counts['inserted'], counts['updated']
+
+
+def bulk_import(cur, schema: str, target: str, body: str, fmt: str) -> dict:
+    '''Импорт CSV/NDJSON в справочник или инвентарь: проверка, COPY во временную таблицу, слияние.
+
+    Выполняется в текущей транзакции; коммит — за вызывающим.
+    '''
+    locations = load_locations(cur, schema) if target == 'products' else {}
+    rows, rejected, total = parse_rows(body, fmt, target, locations)
+    inserted = updated = 0
+    if rows:
+        copy_to_staging(cur, target, rows)
+        inserted, updated = merge_catalog(cur, schema) if target == 'catalog' else merge_products(cur, schema)
+    return {
+        'target': target,
+        'total': total,
+        'inserted': inserted,
+        'updated': updated,
+        'rejected': len(rejected),
+        'errors': rejected[:IMPORT_ERRORS_SHOWN]
+    }
@@ -0,0 +1,40 @@
+def reference_version(cur, schema: str, name: str) -> int:
+    '''Текущая версия справочника из reference_versions (ведётся триггерами)'''
+    cur.execute(f'SELECT version FROM {schema}.reference_versions WHERE name = %s', (name,))
+    row = cur.fetchone()
+    return row['version'] if row else 0
+
+
+def make_etag(name: str, version: int) -> str:
+    return f'"{name}-{version}"'
+
+
+def etag_matches(event: dict, etag: str) -> bool:
+    '''Совпадает ли ETag с одним из значений If-None-Match запроса'''
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    header = headers.get('if-none-match')
+    if not header:
+        return False
+    for value in header.split(','):
+        value = value.strip()
+        if value == '*' or value.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> dict:
+    '''Заголовки для ответа со справочником: браузер перепроверяет его по ETag'''
+    return {
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+
+
+def not_modified(etag: str) -> dict:
+    return {
+        'statusCode': 304,
+        'headers': {'Access-Control-Allow-Origin': '*', **cache_headers(etag)},
+        'body': '',
+        'isBase64Encoded': False
+    }
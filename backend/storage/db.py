@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+
+try:
+    import psycopg2
+    from psycopg2 import extensions
+except ImportError:
+    import psycopg2_binary as psycopg2
+    from psycopg2_binary import extensions
+
+from metrics import InstrumentedConnection
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '2'))
+POOL_PING_INTERVAL = float(os.environ.get('DB_POOL_PING_INTERVAL', '30'))
+
+
+class ConnectionPool:
+    '''Пул соединений с БД, переживающий тёплые вызовы функции'''
+
+    def __init__(self, dsn: str, max_size: int = POOL_MAX_SIZE, ping_interval: float = POOL_PING_INTERVAL):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.ping_interval = ping_interval
+        self._idle = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+        self.discarded = 0
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, connection_factory=InstrumentedConnection)
+
+    def _is_alive(self, conn, idle_since: float) -> bool:
+        '''Проверяет соединение; SELECT 1 только если оно долго простаивало'''
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _close_quietly(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def acquire(self):
+        '''Возвращает живое соединение из пула или открывает новое'''
+        while True:
+            with self._lock:
+                if not self._idle:
+                    self.misses += 1
+                    break
+                conn, idle_since = self._idle.pop()
+            alive = self._is_alive(conn, idle_since)
+            with self._lock:
+                if alive:
+                    self.hits += 1
+                else:
+                    self.reconnects += 1
+            if alive:
+                return conn
+            self._close_quietly(conn)
+        return self._connect()
+
+    def release(self, conn):
+        '''Откатывает незавершённую транзакцию и возвращает соединение в пул'''
+        if conn.closed:
+            self.discarded += 1
+            return
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._close_quietly(conn)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._close_quietly(conn)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reconnects': self.reconnects,
+            'discarded': self.discarded,
+            'idle': len(self._idle),
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
+
+
+pool = ConnectionPool(DATABASE_URL)
+
+
+def get_connection():
+    return pool.acquire()
+
+
+def release_connection(conn):
+    pool.release(conn)
@@ -1,12 +1,181 @@
 import json
+import math
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import uuid
+from datetime import date
+from psycopg2.extras import RealDictCursor, execute_values
+
+from bulk_import import bulk_import, import_request
+from cache import TTLCache
+from conditional import cache_headers, etag_matches, make_etag, not_modified, reference_version
+from db import get_connection, release_connection
+from encoder import encode, fetch_dicts, json_cursor
+from metrics import dumps, instrumented, register_stats
+from pagination import page_request, split_page
+from sync import changes_since
+from units import normalize_unit
 
-DATABASE_URL = os.environ.get('DATABASE_URL')
 SCHEMA = os.environ.get('MAIN_DB_SCHEMA', 'public')
+EXPIRING_SOON_DAYS = 7
+MAX_EXPIRING_DAYS = 3650
+PRODUCT_PAGE_KEYS = ('added_date', 'id')
+SYNC_TABLES = ('storage_locations', 'products')
+MAX_BATCH_SIZE = 500
+MAX_CALORIES = 2 ** 31 - 1
+# DECIMAL(10, 2): после округления до копеек значение должно быть меньше 10^8
+MAX_QUANTITY = 10 ** 8
+# Длины VARCHAR колонок products
+PRODUCT_TEXT_LIMITS = (('name', 200), ('unit', 20), ('category', 100))
+
+reference_cache = TTLCache()
+register_stats('reference_cache', reference_cache.stats)
+
+
+def load_catalog(conn) -> str:
+    '''Справочник сразу в JSON: в кэше лежит готовое тело ответа'''
+    with json_cursor(conn) as cur:
+        cur.execute(f"""
+            SELECT id, name, category, calories_per_100g, default_unit, density, piece_weight, created_at
+            FROM {SCHEMA}.product_catalog
+            ORDER BY name
+        """)
+        return encode(fetch_dicts(cur))
+
+
+def load_location(cur, location_id: str) -> dict:
+    '''Место хранения для кэша — без items_count: его меняют триггеры на любую запись
+    в products, в том числе из других функций, и в кэше он бы устаревал'''
+    cur.execute(f'SELECT * FROM {SCHEMA}.storage_locations WHERE id = %s', (location_id,))
+    location = cur.fetchone()
+    if not location:
+        return None
+    location = dict(location)
+    location.pop('items_count', None)
+    return location
+
+
+def location_items_count(cur, location_id: str):
+    cur.execute(f'SELECT items_count FROM {SCHEMA}.storage_locations WHERE id = %s', (location_id,))
+    row = cur.fetchone()
+    return row['items_count'] if row else None
+
+
+def is_uuid(value) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
 
 
+def is_date(value) -> bool:
+    '''Пустое значение или дата YYYY-MM-DD'''
+    if value is None or value == '':
+        return True
+    try:
+        date.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def is_quantity(value) -> bool:
+    '''Конечное число, помещающееся в DECIMAL(10, 2)'''
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    return math.isfinite(value) and abs(round(value, 2)) < MAX_QUANTITY
+
+
+def text_too_long(product: dict):
+    '''Первое текстовое поле длиннее своей колонки VARCHAR или None'''
+    for field, limit in PRODUCT_TEXT_LIMITS:
+        value = product.get(field)
+        if field == 'unit' and value:
+            value = normalize_unit(value)
+        if value is not None and len(str(value)) > limit:
+            return field, limit
+    return None
+
+
+def is_calories(value) -> bool:
+    '''Пустое значение или неотрицательное целое, помещающееся в INTEGER'''
+    if value is None:
+        return True
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= MAX_CALORIES
+
+
+def expiring_days(query_params: dict) -> int:
+    '''Горизонт «скоро истекает» из expiringDays в пределах 0..MAX_EXPIRING_DAYS; ValueError, если не число'''
+    days = int(query_params.get('expiringDays') or EXPIRING_SOON_DAYS)
+    return min(max(days, 0), MAX_EXPIRING_DAYS)
+
+
+def bulk_add_products(cur, products: list) -> list:
+    '''Добавляет продукты одним INSERT; некорректные позиции возвращаются с ошибкой.
+
+    Всё, на чём INSERT мог бы упасть, проверяется заранее: одна плохая позиция
+    не должна откатывать всю пачку.
+    '''
+    results = [{'index': i} for i in range(len(products))]
+    rows = []
+    locations = set()
+    for result, product in zip(results, products):
+        if not isinstance(product, dict) or not product.get('name') or not product.get('unit'):
+            result.update({'status': 'error', 'error': 'Name and unit required'})
+        elif not is_quantity(product.get('quantity')):
+            result.update({'status': 'error', 'error': f'Quantity must be a number below {MAX_QUANTITY}'})
+        elif text_too_long(product):
+            field, limit = text_too_long(product)
+            result.update({'status': 'error', 'error': f'{field.capitalize()} must be at most {limit} characters'})
+        elif not is_uuid(product.get('storageLocationId')):
+            result.update({'status': 'error', 'error': 'Invalid storage location ID'})
+        elif not is_date(product.get('expiryDate')):
+            result.update({'status': 'error', 'error': 'Expiry date must be YYYY-MM-DD'})
+        elif not is_calories(product.get('caloriesPer100g')):
+            result.update({'status': 'error', 'error': 'Calories must be a non-negative integer'})
+        else:
+            locations.add(str(uuid.UUID(str(product['storageLocationId']))))
+
+    if locations:
+        cur.execute(
+            f'SELECT id::text AS id FROM {SCHEMA}.storage_locations WHERE id = ANY(%s::uuid[])',
+            (list(locations),)
+        )
+        existing = {row['id'] for row in cur.fetchall()}
+        for result, product in zip(results, products):
+            if 'status' in result:
+                continue
+            if str(uuid.UUID(str(product['storageLocationId']))) not in existing:
+                result.update({'status': 'error', 'error': 'Storage location not found'})
+                continue
+            result['id'] = str(uuid.uuid4())
+            rows.append((
+                result['id'], product['name'], product['quantity'], normalize_unit(product['unit']),
+                product.get('category'), product.get('expiryDate') or None, product['storageLocationId'],
+                product.get('notes'), product.get('caloriesPer100g')
+            ))
+
+    if rows:
+        inserted = execute_values(
+            cur,
+            f'''INSERT INTO {SCHEMA}.products
+                (id, name, quantity, unit, category, expiry_date, storage_location_id, notes, calories_per_100g)
+                SELECT v.id::uuid, v.name, v.quantity::numeric, v.unit, v.category, v.expiry_date::date,
+                    v.location::uuid, v.notes, v.calories::integer
+                FROM (VALUES %s) AS v(id, name, quantity, unit, category, expiry_date, location, notes, calories)
+                RETURNING *''',
+            rows,
+            page_size=len(rows),
+            fetch=True
+        )
+        by_id = {str(product['id']): dict(product) for product in inserted}
+        for result in results:
+            if result.get('id') in by_id:
+                result.update({'status': 'ok', 'product': by_id[result['id']]})
+    return results
+
+
+@instrumented
 def handler(event: dict, context) -> dict:
     '''API для управления местами хранения, продуктами и справочником товаров'''
     method = event.get('httpMethod', 'GET')
@@ -17,13 +186,13 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
             'body': '',
             'isBase64Encoded': False
         }
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
@@ -32,16 +201,15 @@ def handler(event: dict, context) -> dict:
         
         if action == 'catalog':
             if method == 'GET':
-                cur.execute(f"""
-                    SELECT id, name, category, calories_per_100g, default_unit, created_at
-                    FROM {SCHEMA}.product_catalog
-                    ORDER BY name
-                """)
-                products = cur.fetchall()
+                version = reference_version(cur, SCHEMA, 'product_catalog')
+                etag = make_etag('catalog', version)
+                if etag_matches(event, etag):
+                    return not_modified(etag)
+                body = reference_cache.get_or_load(('catalog', version), lambda: load_catalog(conn))
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(p) for p in products], default=str),
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **cache_headers(etag)},
+                    'body': body,
                     'isBase64Encoded': False
                 }
             
@@ -49,22 +217,26 @@ def handler(event: dict, context) -> dict:
                 data = json.loads(event.get('body', '{}'))
                 cur.execute(f"""
                     INSERT INTO {SCHEMA}.product_catalog 
-                    (name, category, calories_per_100g, default_unit)
-                    VALUES (%s, %s, %s, %s)
+                    (name, category, calories_per_100g, default_unit, density, piece_weight)
+                    VALUES (%s, %s, %s, %s, %s, %s)
                     ON CONFLICT (name) DO UPDATE SET
                         category = EXCLUDED.category,
                         calories_per_100g = EXCLUDED.calories_per_100g,
                         default_unit = EXCLUDED.default_unit,
+                        density = EXCLUDED.density,
+                        piece_weight = EXCLUDED.piece_weight,
                         updated_at = CURRENT_TIMESTAMP
                     RETURNING *
                 """, (data.get('name'), data.get('category'), 
-                      data.get('calories_per_100g'), data.get('default_unit', 'г')))
+                      data.get('calories_per_100g'), normalize_unit(data.get('default_unit', 'г')),
+                      data.get('density'), data.get('piece_weight')))
                 product = cur.fetchone()
                 conn.commit()
+                reference_cache.invalidate('catalog')
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(product), default=str),
+                    'body': dumps(dict(product), default=str),
                     'isBase64Encoded': False
                 }
             
@@ -73,17 +245,19 @@ def handler(event: dict, context) -> dict:
                 cur.execute(f"""
                     UPDATE {SCHEMA}.product_catalog
                     SET name = %s, category = %s, calories_per_100g = %s, 
-                        default_unit = %s, updated_at = CURRENT_TIMESTAMP
+                        default_unit = %s, density = %s, piece_weight = %s, updated_at = CURRENT_TIMESTAMP
                     WHERE id = %s
                     RETURNING *
                 """, (data.get('name'), data.get('category'), 
-                      data.get('calories_per_100g'), data.get('default_unit'), data.get('id')))
+                      data.get('calories_per_100g'), normalize_unit(data.get('default_unit')),
+                      data.get('density'), data.get('piece_weight'), data.get('id')))
                 product = cur.fetchone()
                 conn.commit()
+                reference_cache.invalidate('catalog')
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(product), default=str),
+                    'body': dumps(dict(product), default=str),
                     'isBase64Encoded': False
                 }
             
@@ -91,46 +265,123 @@ def handler(event: dict, context) -> dict:
                 product_id = query_params.get('id')
                 cur.execute(f"DELETE FROM {SCHEMA}.product_catalog WHERE id = %s", (product_id,))
                 conn.commit()
+                reference_cache.invalidate('catalog')
                 return {
                     'statusCode': 200,
                     'headers': {'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True}),
+                    'body': dumps({'success': True}),
                     'isBase64Encoded': False
                 }
 
+        if action == 'import' and method == 'POST':
+            try:
+                target, fmt, text = import_request(event)
+                result = bulk_import(cur, SCHEMA, target, text, fmt)
+            except (ValueError, UnicodeDecodeError) as e:
+                conn.rollback()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            conn.commit()
+            reference_cache.invalidate('catalog' if target == 'catalog' else 'location')
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': dumps(result, default=str),
+                'isBase64Encoded': False
+            }
+
         if method == 'GET':
+            if 'since' in query_params:
+                try:
+                    result = changes_since(cur, SCHEMA, query_params['since'], SYNC_TABLES)
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': 'Invalid sync token'}),
+                        'isBase64Encoded': False
+                    }
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps(result, default=str),
+                    'isBase64Encoded': False
+                }
+
             location_id = query_params.get('id')
 
             if location_id:
-                cur.execute(
-                    f'SELECT * FROM {SCHEMA}.storage_locations WHERE id = %s',
-                    (location_id,)
-                )
-                location = cur.fetchone()
-
-                cur.execute(
-                    f'SELECT * FROM {SCHEMA}.products WHERE storage_location_id = %s ORDER BY added_date DESC',
-                    (location_id,)
-                )
-                products = cur.fetchall()
+                try:
+                    page_size, after = page_request(query_params, len(PRODUCT_PAGE_KEYS))
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': 'Invalid cursor'}),
+                        'isBase64Encoded': False
+                    }
+
+                location = reference_cache.get_or_load(('location', location_id), lambda: load_location(cur, location_id))
+                if location:
+                    location = {**location, 'items_count': location_items_count(cur, location_id)}
+
+                with json_cursor(conn) as list_cur:
+                    if page_size:
+                        where = ''
+                        params = [location_id]
+                        if after:
+                            where = 'AND (added_date, id) < (%s, %s)'
+                            params.extend(after)
+                        list_cur.execute(
+                            f'''SELECT * FROM {SCHEMA}.products WHERE storage_location_id = %s {where}
+                                ORDER BY added_date DESC, id DESC
+                                LIMIT %s''',
+                            params + [page_size + 1]
+                        )
+                        products, next_cursor = split_page(fetch_dicts(list_cur), page_size, PRODUCT_PAGE_KEYS)
+                    else:
+                        list_cur.execute(
+                            f'SELECT * FROM {SCHEMA}.products WHERE storage_location_id = %s ORDER BY added_date DESC',
+                            (location_id,)
+                        )
+                        products = fetch_dicts(list_cur)
 
                 result = {
-                    'location': dict(location) if location else None,
-                    'products': [dict(p) for p in products]
+                    'location': location,
+                    'products': products
                 }
+                if page_size:
+                    result['next_cursor'] = next_cursor
             else:
-                cur.execute(f'SELECT * FROM {SCHEMA}.storage_locations ORDER BY created_at')
-                locations = cur.fetchall()
-
-                for loc in locations:
-                    cur.execute(
-                        f'SELECT COUNT(*) as count FROM {SCHEMA}.products WHERE storage_location_id = %s',
-                        (loc['id'],)
-                    )
-                    count_result = cur.fetchone()
-                    loc['items_count'] = count_result['count'] if count_result else 0
-
-                result = [dict(loc) for loc in locations]
+                with json_cursor(conn) as list_cur:
+                    if query_params.get('stats') in ('1', 'true'):
+                        try:
+                            days = expiring_days(query_params)
+                        except ValueError:
+                            return {
+                                'statusCode': 400,
+                                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                                'body': dumps({'error': 'expiringDays must be an integer'}),
+                                'isBase64Encoded': False
+                            }
+                        list_cur.execute(
+                            f'''SELECT sl.*,
+                                    COUNT(p.id) FILTER (WHERE p.expiry_date <= CURRENT_DATE + %s) AS expiring_soon_count,
+                                    COALESCE(SUM(COALESCE(p.total_price, p.price * p.quantity)), 0) AS total_value
+                                FROM {SCHEMA}.storage_locations sl
+                                LEFT JOIN {SCHEMA}.products p ON p.storage_location_id = sl.id
+                                GROUP BY sl.id
+                                ORDER BY sl.created_at''',
+                            (days,)
+                        )
+                    else:
+                        list_cur.execute(f'SELECT * FROM {SCHEMA}.storage_locations ORDER BY created_at')
+                    result = fetch_dicts(list_cur)
 
             return {
                 'statusCode': 200,
@@ -138,7 +389,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(result, default=str),
+                'body': encode(result),
                 'isBase64Encoded': False
             }
 
@@ -157,7 +408,70 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 201,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(location), default=str),
+                    'body': dumps(dict(location), default=str),
+                    'isBase64Encoded': False
+                }
+
+            if action in ('bulkAddProducts', 'bulkDeleteProducts'):
+                key = 'products' if action == 'bulkAddProducts' else 'ids'
+                entries = body.get(key)
+                if not isinstance(entries, list) or not entries or len(entries) > MAX_BATCH_SIZE:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': dumps({'error': f'{key} must be a list of 1 to {MAX_BATCH_SIZE} items'}),
+                        'isBase64Encoded': False
+                    }
+
+                if action == 'bulkAddProducts':
+                    results = bulk_add_products(cur, entries)
+                else:
+                    ids = [str(uuid.UUID(str(i))) for i in entries if is_uuid(i)]
+                    cur.execute(
+                        f'DELETE FROM {SCHEMA}.products WHERE id = ANY(%s::uuid[]) RETURNING id::text AS id',
+                        (ids,)
+                    )
+                    deleted = {row['id'] for row in cur.fetchall()}
+                    results = [
+                        {'index': i, 'id': product_id,
+                         'status': 'ok' if is_uuid(product_id) and str(uuid.UUID(str(product_id))) in deleted
+                         else 'not_found'}
+                        for i, product_id in enumerate(entries)
+                    ]
+                conn.commit()
+                reference_cache.invalidate('location')
+
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({
+                        'results': results,
+                        'applied': sum(1 for r in results if r['status'] == 'ok')
+                    }, default=str),
+                    'isBase64Encoded': False
+                }
+
+            if action == 'reconcileCounts':
+                cur.execute(
+                    f'''UPDATE {SCHEMA}.storage_locations sl
+                        SET items_count = c.count
+                        FROM (
+                            SELECT l.id, COUNT(p.id) AS count
+                            FROM {SCHEMA}.storage_locations l
+                            LEFT JOIN {SCHEMA}.products p ON p.storage_location_id = l.id
+                            GROUP BY l.id
+                        ) c
+                        WHERE sl.id = c.id AND sl.items_count IS DISTINCT FROM c.count
+                        RETURNING sl.id, sl.items_count'''
+                )
+                repaired = cur.fetchall()
+                conn.commit()
+                reference_cache.invalidate('location')
+
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': dumps({'repaired': len(repaired), 'locations': [dict(r) for r in repaired]}, default=str),
                     'isBase64Encoded': False
                 }
 
@@ -169,7 +483,7 @@ def handler(event: dict, context) -> dict:
                 (
                     body.get('name'),
                     body.get('quantity'),
-                    body.get('unit'),
+                    normalize_unit(body.get('unit')),
                     body.get('category'),
                     body.get('expiryDate'),
                     body.get('storageLocationId'),
@@ -179,6 +493,7 @@ def handler(event: dict, context) -> dict:
             )
             product = cur.fetchone()
             conn.commit()
+            reference_cache.invalidate('location')
 
             return {
                 'statusCode': 201,
@@ -186,7 +501,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(dict(product), default=str),
+                'body': dumps(dict(product), default=str),
                 'isBase64Encoded': False
             }
 
@@ -198,26 +513,29 @@ def handler(event: dict, context) -> dict:
                 cur.execute(
                     f'''UPDATE {SCHEMA}.products 
                         SET name = %s, quantity = %s, unit = %s, category = %s, 
-                            expiry_date = %s, notes = %s, calories_per_100g = %s
+                            expiry_date = %s, notes = %s, calories_per_100g = %s,
+                            storage_location_id = COALESCE(%s, storage_location_id)
                         WHERE id = %s RETURNING *''',
                     (
                         body.get('name'),
                         body.get('quantity'),
-                        body.get('unit'),
+                        normalize_unit(body.get('unit')),
                         body.get('category'),
                         body.get('expiryDate'),
                         body.get('notes'),
                         body.get('caloriesPer100g'),
+                        body.get('storageLocationId'),
                         product_id
                     )
                 )
                 product = cur.fetchone()
                 conn.commit()
+                reference_cache.invalidate('location')
 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(product) if product else {}, default=str),
+                    'body': dumps(dict(product) if product else {}, default=str),
                     'isBase64Encoded': False
                 }
 
@@ -233,11 +551,12 @@ def handler(event: dict, context) -> dict:
                 )
                 location = cur.fetchone()
                 conn.commit()
+                reference_cache.invalidate(('location', location_id))
 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(location) if location else {}, default=str),
+                    'body': dumps(dict(location) if location else {}, default=str),
                     'isBase64Encoded': False
                 }
 
@@ -246,11 +565,12 @@ def handler(event: dict, context) -> dict:
                 location_id = query_params.get('id')
                 cur.execute(f'DELETE FROM {SCHEMA}.storage_locations WHERE id = %s', (location_id,))
                 conn.commit()
+                reference_cache.invalidate(('location', location_id))
 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True}),
+                    'body': dumps({'success': True}),
                     'isBase64Encoded': False
                 }
 
@@ -260,12 +580,13 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Product ID required'}),
+                    'body': dumps({'error': 'Product ID required'}),
                     'isBase64Encoded': False
                 }
 
             cur.execute(f'DELETE FROM {SCHEMA}.products WHERE id = %s', (product_id,))
             conn.commit()
+            reference_cache.invalidate('location')
 
             return {
                 'statusCode': 204,
@@ -277,10 +598,10 @@ def handler(event: dict, context) -> dict:
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': dumps({'error': 'Method not allowed'}),
             'isBase64Encoded': False
         }
 
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
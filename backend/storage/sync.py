@@ -0,0 +1,105 @@
+import base64
+import json
+import os
+import time
+
+CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', '30'))
+PRUNE_INTERVAL = 3600
+XID8_LIMIT = 2 ** 64
+
+_last_prune = 0.0
+
+
+def encode_token(xmin: str, issued: int) -> str:
+    raw = json.dumps([xmin, issued], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token: str):
+    '''Разбирает токен синхронизации; ValueError, если он повреждён.
+
+    Ошибки base64, JSON и приведения типов (issued: null, [], 1e999) сводятся
+    к ValueError, чтобы обработчик ответил 400, а не 500.
+    '''
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != 2:
+            raise ValueError('Invalid sync token')
+        xmin, issued = values
+        if not isinstance(xmin, str) or not (xmin.isascii() and xmin.isdigit()) or int(xmin) >= XID8_LIMIT:
+            raise ValueError('Invalid sync token')
+        return xmin, int(issued)
+    except (ValueError, TypeError, OverflowError) as error:
+        raise ValueError('Invalid sync token') from error
+
+
+def issue_token(cur) -> str:
+    '''Новый токен: xmin текущего снимка — все более ранние транзакции уже завершены'''
+    cur.execute(
+        '''SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS xmin,
+                  EXTRACT(EPOCH FROM now())::bigint AS issued'''
+    )
+    row = cur.fetchone()
+    return encode_token(row['xmin'], row['issued'])
+
+
+def table_changes(cur, schema: str, table: str, since_xmin: str = None) -> dict:
+    '''Строки таблицы, изменённые начиная с транзакции since_xmin, и id удалённых'''
+    if since_xmin is None:
+        cur.execute(f'SELECT * FROM {schema}.{table}')
+        return {'upserts': [dict(row) for row in cur.fetchall()], 'deleted': []}
+
+    cur.execute(
+        f'''SELECT c.row_id AS changed_id, t.*
+            FROM (
+                SELECT DISTINCT row_id FROM {schema}.change_log
+                WHERE table_name = %s AND txid >= %s::xid8
+            ) c
+            LEFT JOIN {schema}.{table} t ON t.id = c.row_id''',
+        (table, since_xmin)
+    )
+    upserts = []
+    deleted = []
+    for row in cur.fetchall():
+        changed_id = row.pop('changed_id')
+        if row['id'] is None:
+            deleted.append(changed_id)
+        else:
+            upserts.append(dict(row))
+    return {'upserts': upserts, 'deleted': deleted}
+
+
+def prune_change_log(cur, schema: str):
+    '''Не чаще раза в час удаляет записи журнала старше срока хранения'''
+    global _last_prune
+    if time.monotonic() - _last_prune < PRUNE_INTERVAL:
+        return
+    cur.execute(
+        f'DELETE FROM {schema}.change_log WHERE changed_at < CURRENT_TIMESTAMP - %s * INTERVAL \'1 day\'',
+        (CHANGE_LOG_RETENTION_DAYS,)
+    )
+    cur.connection.commit()
+    _last_prune = time.monotonic()
+
+
+def changes_since(cur, schema: str, since: str, tables: tuple) -> dict:
+    '''Ответ на since=<токен>: изменения по таблицам и новый токен.
+
+    Пустой или устаревший токен (старше срока хранения журнала) даёт полный
+    снимок таблиц с reset=True — клиент заменяет локальную копию целиком.
+    Изменения отдаются «хотя бы один раз»: строка может прийти повторно.
+    '''
+    since_xmin = None
+    if since and since != '0':
+        since_xmin, issued = decode_token(since)
+        if time.time() - issued > CHANGE_LOG_RETENTION_DAYS * 86400:
+            since_xmin = None
+
+    prune_change_log(cur, schema)
+    token = issue_token(cur)
+    return {
+        'changes': {table: table_changes(cur, schema, table, since_xmin) for table in tables},
+        'token': token,
+        'reset': since_xmin is None
+    }
@@ -0,0 +1,130 @@
+'''Выдача больших списков: RealDictCursor + json.dumps(default=...) против encoder.py
+
+Поднимает одноразовую базу (как bench_handlers.py) и выбирает N строк формы
+типичного списка (uuid, текст, numeric, date, timestamp, integer). Для каждого
+варианта замеряется материализация строк и сериализация в JSON по отдельности:
+
+  dict+default=str       — RealDictCursor, [dict(r) ...], json.dumps(default=str)
+  dict+decimal_default   — то же с default, превращающим Decimal в float (menu)
+  encoder[json]          — json_cursor, fetch_dicts, encode без orjson
+  encoder[orjson]        — то же с orjson (если установлен)
+
+Запуск:
+    python benchmarks/bench_encoder.py
+    python benchmarks/bench_encoder.py --rows 100000 --repeat 5
+'''
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_handlers import BACKEND, create_database, start_server  # noqa: E402
+
+QUERY = '''
+    SELECT gen_random_uuid() AS id, 'Продукт ' || i AS name, (i %% 1000) / 7.0::numeric(10, 2) AS quantity,
+        'г' AS unit, 'Категория ' || (i %% 20) AS category, DATE '2026-01-01' + (i %% 365) AS expiry_date,
+        gen_random_uuid() AS storage_location_id, TIMESTAMP '2026-01-01' + i * INTERVAL '1 minute' AS added_date,
+        NULL::text AS notes, (i %% 500)::numeric(10, 2) AS price, i %% 900 AS calories_per_100g
+    FROM generate_series(1, %s) i
+'''
+
+
+def decimal_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return str(obj)
+
+
+def load_encoder(with_orjson: bool):
+    '''encoder.py функции storage; без orjson — как если бы пакет не был установлен'''
+    sys.path.insert(0, os.path.join(BACKEND, 'storage'))
+    saved = sys.modules.get('orjson')
+    if not with_orjson:
+        sys.modules['orjson'] = None
+    try:
+        spec = importlib.util.spec_from_file_location(
+            f'encoder_{with_orjson}', os.path.join(BACKEND, 'storage', 'encoder.py')
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    finally:
+        sys.path.pop(0)
+        if not with_orjson:
+            if saved is None:
+                sys.modules.pop('orjson', None)
+            else:
+                sys.modules['orjson'] = saved
+
+
+def measure(conn, rows: int, repeat: int, fetch, serialize) -> tuple:
+    '''(лучшее время выборки, лучшее время сериализации, размер JSON)'''
+    fetch_times, encode_times = [], []
+    body = ''
+    for _ in range(repeat):
+        started = time.perf_counter()
+        data = fetch(conn, rows)
+        fetch_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        body = serialize(data)
+        encode_times.append(time.perf_counter() - started)
+        conn.rollback()
+    return min(fetch_times), min(encode_times), len(body.encode('utf-8'))
+
+
+def dict_rows(conn, rows: int) -> list:
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(QUERY, (rows,))
+        return [dict(r) for r in cur.fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='DSN сервера Postgres')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    variants = [
+        ('dict+default=str', dict_rows, lambda data: json.dumps(data, default=str)),
+        ('dict+decimal_default', dict_rows, lambda data: json.dumps(data, default=decimal_default)),
+    ]
+    for with_orjson in (False, True):
+        encoder = load_encoder(with_orjson)
+        if with_orjson and encoder.orjson is None:
+            print('orjson is not installed, skipping encoder[orjson]')
+            continue
+
+        def fetch(conn, rows, encoder=encoder):
+            with encoder.json_cursor(conn) as cur:
+                cur.execute(QUERY, (rows,))
+                return encoder.fetch_dicts(cur)
+
+        variants.append((f'encoder[{encoder.JSON_BACKEND}]', fetch, encoder.encode))
+
+    server_dsn, server = start_server(args.dsn)
+    try:
+        conn = psycopg2.connect(create_database(server_dsn))
+        print(f'{args.rows} rows, best of {args.repeat}')
+        print(f"{'variant':24} {'fetch ms':>9} {'json ms':>9} {'total ms':>9} {'rows/s':>10} {'body KB':>8}")
+        for name, fetch, serialize in variants:
+            fetch_s, encode_s, size = measure(conn, args.rows, args.repeat, fetch, serialize)
+            total = fetch_s + encode_s
+            print(f'{name:24} {fetch_s * 1000:9.1f} {encode_s * 1000:9.1f} {total * 1000:9.1f} '
+                  f'{args.rows / total:10.0f} {size / 1024:8.0f}')
+        conn.close()
+    finally:
+        if server is not None:
+            server.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+'''Оценка выполнимости рецептов из backend/menu/feasibility.py на синтетических данных
+
+Без БД: 1000 рецептов по 6 ингредиентов против 5000 продуктов. Холодный вызов строит
+индекс и кэш сопоставлений с нуля (и со сброшенным кэшем триграмм слов), тёплый —
+как повторный запрос в том же экземпляре. Холодный замер повторяется, печатаются
+медиана и лучший результат, а также его части: сверка кэша с запасами, построение
+индекса, сопоставление названий и сама оценка. Выборка строк из БД сюда не входит —
+её вместе с обработчиком меряет bench_handlers.py (menu.feasibility).
+
+Запуск: python benchmarks/bench_feasibility.py [рецептов] [продуктов]
+'''
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'menu'))
+
+from bench_matching import BASES, MODIFIERS, QUERIES, generate_products  # noqa: E402
+from feasibility import evaluate_recipes  # noqa: E402
+from matching import MatchCache, ProductMatcher, word_trigrams  # noqa: E402
+
+UNITS = ['г', 'кг', 'мл', 'л', 'шт']
+
+
+def generate_rows(recipes: int, per_recipe: int = 6, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    names = BASES + QUERIES + [f'{base} {modifier}' for base in BASES[:12] for modifier in MODIFIERS[:6]]
+    rows = []
+    for r in range(recipes):
+        for _ in range(per_recipe):
+            rows.append({
+                'recipe_id': r,
+                'recipe_name': f'Рецепт {r}',
+                'product_name': rng.choice(names),
+                'quantity': rng.choice([1, 2, 50, 100, 250, 500]),
+                'unit': rng.choice(UNITS)
+            })
+    return rows
+
+
+def main():
+    recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    rng = random.Random(1)
+    products = generate_products(count)
+    for product in products:
+        product['quantity'] = rng.choice([0.5, 1, 3, 200, 1000])
+        product['unit'] = rng.choice(UNITS)
+    rows = generate_rows(recipes)
+
+    names = {row['product_name'] for row in rows}
+    cold = []
+    parts = []
+    for _ in range(5):
+        word_trigrams.cache_clear()
+        started = time.perf_counter()
+        results = evaluate_recipes(rows, ProductMatcher(products, cache=MatchCache()))
+        cold.append((time.perf_counter() - started) * 1000)
+
+        word_trigrams.cache_clear()
+        marks = [time.perf_counter()]
+        matcher = ProductMatcher(products, cache=MatchCache())
+        marks.append(time.perf_counter())
+        matcher._build()
+        marks.append(time.perf_counter())
+        for name in names:
+            matcher.match(name)
+        marks.append(time.perf_counter())
+        evaluate_recipes(rows, matcher)
+        marks.append(time.perf_counter())
+        parts.append([(b - a) * 1000 for a, b in zip(marks, marks[1:])])
+
+    cache = MatchCache()
+    evaluate_recipes(rows, ProductMatcher(products, cache=cache))
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        evaluate_recipes(rows, ProductMatcher(products, cache=cache))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    by_status = {}
+    for result in results:
+        by_status[result['status']] = by_status.get(result['status'], 0) + 1
+    print(f'{recipes} recipes x {count} products, {len(rows)} ingredient rows')
+    print(f'cold: {statistics.median(cold):.1f} ms median, {min(cold):.1f} ms best of 5; '
+          f'warm: {statistics.median(timings):.1f} ms median, {min(timings):.1f} ms best of 5')
+    best = min(parts, key=sum)
+    print('cold parts (best run): ' + ', '.join(
+        f'{label} {value:.1f} ms' for label, value in zip(('sync', 'index', 'match', 'evaluate'), best)
+    ))
+    print(f'statuses: {by_status}')
+
+
+if __name__ == '__main__':
+    main()
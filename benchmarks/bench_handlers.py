@@ -0,0 +1,384 @@
+'''Замеры обработчиков backend/* на одноразовой базе Postgres
+
+Каждый handler импортируется напрямую и вызывается с синтетическим event.
+База создаётся заново: schema_bootstrap.sql, затем все db_migrations по порядку,
+затем масштабируемые данные (по умолчанию 10k продуктов, 100k транзакций,
+чеки на 500 строк). Для каждого действия печатаются p50/p95, число SQL-запросов
+и строк на запрос и размер ответа.
+
+Запуск:
+    python benchmarks/bench_handlers.py                       # временный Postgres через pgserver
+    python benchmarks/bench_handlers.py --dsn postgresql://postgres@localhost/postgres
+    python benchmarks/bench_handlers.py --scale 0.1 --only storage,budget
+    python benchmarks/bench_handlers.py --save benchmarks/baselines/main.json
+    python benchmarks/bench_handlers.py --compare benchmarks/baselines/main.json
+
+Сервер из --dsn используется только для создания отдельной базы inventory_bench,
+которая удаляется и создаётся заново при каждом запуске.
+'''
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import psycopg2
+from psycopg2 import extensions
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_matching import BASES, generate_products  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, 'backend')
+MIGRATIONS = os.path.join(ROOT, 'db_migrations')
+BOOTSTRAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_bootstrap.sql')
+SCHEMA = 't_p56038920_home_inventory_track'
+BENCH_DB = 'inventory_bench'
+FUNCTIONS = ('storage', 'shopping', 'receipts', 'menu', 'budget')
+
+
+def start_server(dsn: str):
+    '''DSN сервера: заданный или временный Postgres из пакета pgserver'''
+    if dsn:
+        return dsn, None
+    try:
+        import pgserver
+    except ImportError:
+        sys.exit('Нужен --dsn или pip install pgserver для временного Postgres')
+    server = pgserver.get_server(tempfile.mkdtemp(prefix='inventory-bench-'), cleanup_mode='delete')
+    return server.get_uri(), server
+
+
+def create_database(server_dsn: str) -> str:
+    conn = psycopg2.connect(server_dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS {BENCH_DB}')
+        cur.execute(f'CREATE DATABASE {BENCH_DB}')
+    conn.close()
+    return extensions.make_dsn(server_dsn, dbname=BENCH_DB)
+
+
+def apply_schema(dsn: str):
+    '''Bootstrap и все миграции по порядку номеров'''
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA}')
+        cur.execute(f'SET search_path TO {SCHEMA}')
+        with open(BOOTSTRAP, encoding='utf-8') as f:
+            cur.execute(f.read())
+        for path in sorted(glob.glob(os.path.join(MIGRATIONS, 'V*.sql'))):
+            with open(path, encoding='utf-8') as f:
+                cur.execute(f.read())
+    conn.commit()
+    conn.close()
+
+
+def seed(dsn: str, scale: float):
+    '''Синтетические данные; объёмы пропорциональны scale'''
+    products = max(int(10_000 * scale), 10)
+    transactions = max(int(100_000 * scale), 10)
+    receipts = max(int(2_000 * scale), 1)
+    shopping = max(int(2_000 * scale), 10)
+    recipes = max(int(300 * scale), 3)
+    catalog = max(int(5_000 * scale), 10)
+    names = [p['name'] for p in generate_products(products)]
+
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(f'SET search_path TO {SCHEMA}')
+        cur.execute(
+            '''INSERT INTO products
+                (name, quantity, unit, category, expiry_date, storage_location_id,
+                 calories_per_100g, price, added_date)
+               SELECT n.name, 1 + n.i %% 50, (ARRAY['г', 'шт', 'мл', 'кг'])[1 + n.i %% 4], 'Продукты',
+                   CURRENT_DATE + (n.i %% 60)::int - 10, l.ids[1 + n.i %% array_length(l.ids, 1)],
+                   50 + n.i %% 400, 10 + n.i %% 500, now() - (n.i %% 2000) * interval '1 hour'
+               FROM unnest(%s::text[]) WITH ORDINALITY AS n(name, i),
+                   (SELECT array_agg(id) AS ids FROM storage_locations) l''',
+            (names,)
+        )
+        cur.execute(
+            '''INSERT INTO product_catalog (name, category, calories_per_100g)
+               SELECT DISTINCT name, 'Продукты', 100 FROM unnest(%s::text[]) AS name
+               ON CONFLICT (name) DO NOTHING''',
+            (names[:catalog],)
+        )
+        cur.execute(
+            '''INSERT INTO transactions (type, amount, category_id, description, date, created_at)
+               SELECT CASE WHEN i %% 10 = 0 THEN 'income' ELSE 'expense' END,
+                   (i %% 5000) + 10,
+                   CASE WHEN i %% 10 = 0 THEN c.income[1 + i %% array_length(c.income, 1)]
+                        ELSE c.expense[1 + i %% array_length(c.expense, 1)] END,
+                   'Операция ' || i, CURRENT_DATE - (i %% 730)::int,
+                   now() - (i %% 730) * interval '1 day' + (i %% 86400) * interval '1 second'
+               FROM generate_series(1, %s) i,
+                   (SELECT array_agg(id) FILTER (WHERE type = 'income') AS income,
+                           array_agg(id) FILTER (WHERE type = 'expense') AS expense
+                    FROM budget_categories) c''',
+            (transactions,)
+        )
+        cur.execute(
+            '''INSERT INTO receipts (qr_code, total_amount, status, created_at)
+               SELECT 't=' || i, 1000, 'processed', now() - i * interval '3 hours'
+               FROM generate_series(1, %s) i''',
+            (receipts,)
+        )
+        cur.execute(
+            '''INSERT INTO receipt_items (receipt_id, name, quantity, price, total, budget_category_name)
+               SELECT r.id, 'Позиция ' || g, 1, 100, 100, 'Продукты'
+               FROM receipts r, generate_series(1, 10) g'''
+        )
+        cur.execute(
+            '''INSERT INTO shopping_items (name, quantity, unit, category, is_purchased, added_date)
+               SELECT n.name, 1 + n.i %% 5, 'шт', 'Продукты', n.i %% 3 = 0, now() - n.i * interval '1 minute'
+               FROM unnest(%s::text[]) WITH ORDINALITY AS n(name, i)''',
+            (names[:shopping],)
+        )
+        cur.execute(
+            '''INSERT INTO recipes (name, description, total_calories, cooking_time, servings)
+               SELECT 'Рецепт ' || i, 'Синтетический рецепт', 500, 30, 2
+               FROM generate_series(1, %s) i''',
+            (recipes,)
+        )
+        cur.execute(
+            '''INSERT INTO recipe_ingredients (recipe_id, product_name, quantity, unit)
+               SELECT r.id, b.names[1 + (abs(hashtext(r.id::text)) + g) %% array_length(b.names, 1)],
+                   50 + g * 20, 'г'
+               FROM recipes r, generate_series(1, 6) g, (SELECT %s::text[] AS names) b''',
+            (BASES,)
+        )
+        cur.execute(
+            '''INSERT INTO food_diary (meal_name, portion_weight, calories, meal_type, eaten_date)
+               SELECT 'Блюдо ' || i, 250, 300 + i %% 400, 'обед', now() - i * interval '8 hours'
+               FROM generate_series(1, %s) i''',
+            (max(int(2_190 * scale), 10),)
+        )
+    conn.commit()
+    conn.close()
+
+
+def load_handler(function: str, dsn: str):
+    '''Импортирует index.py функции изолированно: у каждой свои db.py и соседние модули.
+
+    Возвращает handler и счётчики запросов из metrics.py этой функции.
+    '''
+    directory = os.path.join(BACKEND, function)
+    for name, module in list(sys.modules.items()):
+        if (getattr(module, '__file__', None) or '').startswith(BACKEND + os.sep):
+            del sys.modules[name]
+    os.environ['DATABASE_URL'] = dsn
+    os.environ['MAIN_DB_SCHEMA'] = SCHEMA
+    os.environ['REQUEST_LOG'] = '0'
+    sys.path.insert(0, directory)
+    try:
+        spec = importlib.util.spec_from_file_location(f'bench_{function}_index', os.path.join(directory, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        metrics = sys.modules['metrics'].current
+    finally:
+        sys.path.remove(directory)
+    return module.handler, metrics
+
+
+def event(method: str = 'GET', query: dict = None, body=None, headers: dict = None) -> dict:
+    result = {'httpMethod': method, 'queryStringParameters': query or {}, 'headers': headers or {}}
+    if body is not None:
+        result['body'] = json.dumps(body, ensure_ascii=False)
+    return result
+
+
+def fetch_context(dsn: str) -> dict:
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(f'SET search_path TO {SCHEMA}')
+        cur.execute('SELECT id FROM storage_locations ORDER BY items_count DESC LIMIT 1')
+        location_id = str(cur.fetchone()[0])
+        cur.execute('SELECT id FROM recipes')
+        recipe_ids = [str(r[0]) for r in cur.fetchall()]
+        cur.execute('SELECT name FROM products ORDER BY random() LIMIT 500')
+        product_names = [r[0] for r in cur.fetchall()]
+    conn.close()
+    return {'location_id': location_id, 'recipe_ids': recipe_ids, 'product_names': product_names}
+
+
+def receipt_body(ctx: dict, lines: int, rng: random.Random) -> dict:
+    items = []
+    for i in range(lines):
+        name = rng.choice(ctx['product_names']) if i % 2 else f'Новый товар {rng.randrange(10**9)}'
+        items.append({'name': name, 'price': 10 + i % 300, 'quantity': 1 + i % 3})
+    return {'qr_code': f't={rng.randrange(10**12)}', 'items': items}
+
+
+def build_scenarios(handlers: dict, ctx: dict) -> list:
+    '''(функция, действие, фабрика event, число итераций или None)'''
+    rng = random.Random(7)
+    today = date.today()
+
+    def planned_event():
+        response = handlers['menu'][0](event('POST', {'action': 'plan_recipe'},
+                                          {'recipe_id': rng.choice(ctx['recipe_ids'])}), None)
+        planned_id = json.loads(response['body'])['planned']['id']
+        return event('POST', {'action': 'prepare'}, {'planned_id': planned_id})
+
+    duplicate_receipt = receipt_body(ctx, 500, rng)
+
+    def queued_receipt_event():
+        handlers['receipts'][0](event('POST', body=receipt_body(ctx, 500, rng)), None)
+        return event('POST', {'action': 'process'})
+
+    return [
+        ('storage', 'locations', lambda: event(), None),
+        ('storage', 'locations_stats', lambda: event(query={'stats': '1'}), None),
+        ('storage', 'location_products', lambda: event(query={'id': ctx['location_id']}), None),
+        ('storage', 'location_products_page', lambda: event(query={'id': ctx['location_id'], 'limit': '50'}), None),
+        ('storage', 'catalog', lambda: event(query={'action': 'catalog'}), None),
+        ('storage', 'add_product', lambda: event('POST', body={
+            'name': rng.choice(ctx['product_names']), 'quantity': 1, 'unit': 'шт',
+            'storageLocationId': ctx['location_id']}), None),
+        ('shopping', 'list', lambda: event(), None),
+        ('shopping', 'list_page', lambda: event(query={'limit': '50'}), None),
+        ('receipts', 'list', lambda: event(), None),
+        ('receipts', 'list_page', lambda: event(query={'limit': '50'}), None),
+        ('receipts', 'post_500_lines', lambda: event('POST', body=receipt_body(ctx, 500, rng)), 5),
+        ('receipts', 'drain_500_lines', queued_receipt_event, 5),
+        ('receipts', 'post_duplicate', lambda: event('POST', body=duplicate_receipt), None),
+        ('menu', 'recipes', lambda: event(), None),
+        ('menu', 'food_diary_today', lambda: event(query={'action': 'food_diary', 'date': 'today'}), None),
+        ('menu', 'food_diary_range', lambda: event(query={
+            'action': 'food_diary', 'from': str(today - timedelta(days=30)), 'to': str(today)}), None),
+        ('menu', 'feasibility', lambda: event(query={'action': 'feasibility'}), None),
+        ('menu', 'plan_recipe', lambda: event('POST', {'action': 'plan_recipe'},
+                                              {'recipe_id': rng.choice(ctx['recipe_ids'])}), None),
+        ('menu', 'prepare', planned_event, None),
+        ('budget', 'transactions', lambda: event(), 5),
+        ('budget', 'transactions_page', lambda: event(query={'limit': '50'}), None),
+        ('budget', 'analytics_30', lambda: event(query={'action': 'analytics', 'period': '30'}), None),
+        ('budget', 'analytics_365', lambda: event(query={'action': 'analytics', 'period': '365'}), None),
+        ('budget', 'categories', lambda: event(query={'action': 'categories'}), None),
+        ('budget', 'settings', lambda: event(query={'action': 'settings'}), None),
+    ]
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def run_scenario(handler, metrics, make_event, iterations: int, warmup: int) -> dict:
+    latencies, statements, rows, sizes = [], [], [], []
+    for i in range(warmup + iterations):
+        request = make_event()
+        started = time.perf_counter()
+        response = handler(request, None)
+        elapsed = time.perf_counter() - started
+        if response['statusCode'] >= 400:
+            raise RuntimeError(f"HTTP {response['statusCode']}: {response.get('body')}")
+        if i >= warmup:
+            latencies.append(elapsed * 1000)
+            statements.append(metrics.statements)
+            rows.append(metrics.rows)
+            sizes.append(len(response.get('body') or ''))
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 0.5), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'statements': round(statistics.mean(statements), 2),
+        'rows': round(statistics.mean(rows), 2),
+        'response_bytes': round(statistics.mean(sizes))
+    }
+
+
+def print_table(results: dict, baseline: dict = None):
+    header = f"{'action':36} {'p50 ms':>10} {'p95 ms':>10} {'stmts':>8} {'rows':>10} {'bytes':>12}"
+    if baseline:
+        header += f" {'p50 Δ':>9} {'stmts Δ':>8}"
+    print(header)
+    for key, r in results.items():
+        line = (f"{key:36} {r['p50_ms']:10.2f} {r['p95_ms']:10.2f} {r['statements']:8.1f} "
+                f"{r['rows']:10.1f} {r['response_bytes']:12d}")
+        base = (baseline or {}).get(key)
+        if base:
+            change = (r['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100 if base['p50_ms'] else 0.0
+            line += f" {change:+8.1f}% {r['statements'] - base['statements']:+8.1f}"
+        print(line)
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if r['statements'] > base['statements']:
+            regressions.append(f"{key}: statements {base['statements']} -> {r['statements']}")
+        if r['p50_ms'] > base['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{key}: p50 {base['p50_ms']} -> {r['p50_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='DSN сервера Postgres')
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель объёма данных')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', help='функции через запятую, например storage,budget')
+    parser.add_argument('--save', help='сохранить результаты как базовую линию (JSON)')
+    parser.add_argument('--compare', help='сравнить с сохранённой базовой линией')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимый рост p50 при сравнении')
+    args = parser.parse_args()
+
+    server_dsn, server = start_server(args.dsn)
+    try:
+        dsn = create_database(server_dsn)
+        started = time.perf_counter()
+        apply_schema(dsn)
+        seed(dsn, args.scale)
+        print(f'schema + seed: {time.perf_counter() - started:.1f} s (scale {args.scale})')
+
+        ctx = fetch_context(dsn)
+        only = set(args.only.split(',')) if args.only else set(FUNCTIONS)
+        handlers = {function: load_handler(function, dsn) for function in FUNCTIONS if function in only}
+
+        results = {}
+        for function, action, make_event, iterations in build_scenarios(handlers, ctx):
+            if function not in only:
+                continue
+            results[f'{function}.{action}'] = run_scenario(
+                *handlers[function], make_event, iterations or args.iterations, args.warmup
+            )
+
+        baseline = None
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                baseline = json.load(f)['results']
+        print_table(results, baseline)
+
+        if args.save:
+            os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+            with open(args.save, 'w', encoding='utf-8') as f:
+                json.dump({'scale': args.scale, 'results': results}, f, ensure_ascii=False, indent=2)
+            print(f'baseline saved to {args.save}')
+
+        if baseline:
+            regressions = find_regressions(results, baseline, args.tolerance)
+            for line in regressions:
+                print(f'REGRESSION {line}')
+            if regressions:
+                sys.exit(1)
+    finally:
+        if server is not None:
+            server.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+'''Сравнение полного перебора SequenceMatcher с индексом триграмм из backend/menu/matching.py
+
+Запуск: python benchmarks/bench_matching.py [число_продуктов]
+'''
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'menu'))
+
+from matching import ProductMatcher, similarity  # noqa: E402
+
+BASES = [
+    'Молоко', 'Кефир', 'Сыр', 'Творог', 'Сметана', 'Масло', 'Курица', 'Говядина', 'Свинина',
+    'Рис', 'Гречка', 'Овсянка', 'Макароны', 'Хлеб', 'Помидоры', 'Огурцы', 'Лук', 'Морковь',
+    'Картофель', 'Капуста', 'Яблоки', 'Бананы', 'Сахар', 'Соль', 'Мука', 'Яйца', 'Зелень',
+    'Чеснок', 'Перец', 'Фасоль', 'Горох', 'Сосиски', 'Колбаса', 'Йогурт', 'Ряженка', 'Печенье'
+]
+MODIFIERS = [
+    'домашний', 'отборный', 'фермерский', 'цельный', 'копчёный', 'свежий', 'замороженный',
+    'органический', 'классический', 'нежирный', 'молодой', 'тепличный', 'жареный', 'пастеризованный'
+]
+BRANDS = ['Простоквашино', 'Вкусвилл', 'Мираторг', 'Агуша', 'Петелинка', 'Мистраль', 'Увелка', 'Макфа']
+
+QUERIES = [
+    'Рис', 'Курица', 'Соль', 'Гречка', 'Говядина', 'Лук', 'Помидоры', 'Огурцы', 'Зелень',
+    'Молоко', 'Сыр твердый', 'Куриное филе', 'Картошка', 'Масло сливочное', 'Яйцо', 'Морковка'
+]
+
+
+def generate_products(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        parts = [rng.choice(BASES)]
+        if rng.random() < 0.8:
+            parts.append(rng.choice(MODIFIERS))
+        if rng.random() < 0.6:
+            parts.append(rng.choice(BRANDS))
+        if rng.random() < 0.3:
+            parts.append(f'{rng.randint(1, 20) * 50} г')
+        products.append({'id': i, 'name': ' '.join(parts), 'quantity': 1})
+    for base in BASES:
+        products.insert(rng.randrange(len(products)), {'id': f'plain-{base}', 'name': base, 'quantity': 1})
+    return products
+
+
+def linear_match(product_name: str, available_products: list) -> dict:
+    '''Прежняя реализация find_matching_product'''
+    best_match = None
+    best_score = 0.6
+    for product in available_products:
+        score = similarity(product_name, product['name'])
+        if score > best_score:
+            best_score = score
+            best_match = product
+    return best_match
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    products = generate_products(count)
+
+    started = time.perf_counter()
+    expected = [linear_match(q, products) for q in QUERIES]
+    linear_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matcher = ProductMatcher(products)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = [matcher.match(q) for q in QUERIES]
+    query_time = time.perf_counter() - started
+
+    agree = sum(1 for a, b in zip(expected, actual) if (a and a['id']) == (b and b['id']))
+    print(f'products: {len(products)}, ingredients: {len(QUERIES)}')
+    print(f'linear scan:    {linear_time * 1000:9.1f} ms')
+    print(f'index build:    {build_time * 1000:9.1f} ms')
+    print(f'index queries:  {query_time * 1000:9.1f} ms')
+    print(f'speedup:        {linear_time / (build_time + query_time):9.1f}x (including build)')
+    print(f'same result:    {agree}/{len(QUERIES)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+'''Расчёт калорийности рецептов из backend/menu/nutrition.py на синтетических данных
+
+Без БД: N рецептов по 8 ингредиентов в разных единицах, у части ингредиентов нет
+калорийности в справочнике. Замеряет compute_nutrition — ту часть refresh_nutrition,
+что выполняется в Python после одного запроса к базе.
+
+Запуск: python benchmarks/bench_nutrition.py [рецептов]
+'''
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'menu'))
+
+from nutrition import compute_nutrition  # noqa: E402
+
+UNITS = ['г', 'кг', 'мл', 'л', 'шт', 'ст.л.', 'стакан']
+
+
+def generate_rows(recipes: int, per_recipe: int = 8, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    rows = []
+    for r in range(recipes):
+        for _ in range(per_recipe):
+            rows.append({
+                'recipe_id': r,
+                'quantity': rng.choice([1, 2, 50, 100, 250, 500]),
+                'unit': rng.choice(UNITS),
+                'calories_per_100g': rng.choice([None, 20, 130, 250, 890]),
+                'density': rng.choice([None, 0.6, 0.92, 1.03]),
+                'piece_weight': rng.choice([None, 55, 120])
+            })
+    return rows
+
+
+def main():
+    recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rows = generate_rows(recipes)
+
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        result = compute_nutrition(rows)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    computed = sum(1 for calories, _, _ in result.values() if calories is not None)
+    print(f'{recipes} recipes, {len(rows)} ingredient rows')
+    print(f'compute_nutrition: {min(timings):.1f} ms (best of 5), {computed} recipes with calories')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+'''Проверка, что выгрузка (budget, action=export) не растёт в памяти с числом строк
+
+Поднимает одноразовую базу (как bench_handlers.py), вставляет N транзакций
+(по умолчанию 1 000 000) и дважды выгружает их целиком:
+
+  stream  — генератор export.encode_rows без ограничения объёма: строки идут
+            именованным курсором пачками по EXPORT_ITERSIZE и сразу отбрасываются;
+  handler — handler функции budget, страница за страницей по X-Next-Cursor,
+            как это делает клиент.
+
+После каждой десятой доли строк фиксируется пиковый RSS процесса. Память считается
+плоской, если от первой десятой доли до конца пик вырос меньше чем на --max-growth МБ;
+иначе код выхода ненулевой. Для сравнения печатается, сколько занял бы fetchall().
+
+Запуск:
+    python benchmarks/check_export_memory.py
+    python benchmarks/check_export_memory.py --rows 200000 --format csv
+'''
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_handlers import SCHEMA, apply_schema, create_database, event, load_handler, start_server  # noqa: E402
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux — килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(dsn: str, rows: int):
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(f'SET search_path TO {SCHEMA}')
+        cur.execute(
+            '''INSERT INTO transactions (type, amount, category_id, description, date, created_at)
+               SELECT 'expense', (i %% 5000) / 10.0, c.id, 'Покупка №' || i,
+                   DATE '2025-01-01' + (i %% 365), TIMESTAMP '2025-01-01' + i * INTERVAL '1 second'
+               FROM generate_series(1, %s) i,
+                   (SELECT id FROM budget_categories WHERE type = 'expense' LIMIT 1) c''',
+            (rows,)
+        )
+    conn.commit()
+    conn.close()
+
+
+def check_stream(dsn: str, rows: int, fmt: str) -> list:
+    '''Пики RSS по десятым долям при чтении генератора целиком'''
+    export = sys.modules['export']
+    conn = psycopg2.connect(dsn)
+    marks = []
+    seen = 0
+    step = max(rows // 10, 1)
+    for chunk in export.encode_rows(
+        conn,
+        f'SELECT t.* FROM {SCHEMA}.transactions t ORDER BY t.date, t.created_at, t.id',
+        [], fmt, {}, max_bytes=float('inf')
+    ):
+        seen += chunk.count('\n')
+        while seen >= step * (len(marks) + 1):
+            marks.append(peak_rss_mb())
+    conn.close()
+    return marks
+
+
+def check_handler(handler, rows: int, fmt: str) -> tuple:
+    '''Пики RSS по десятым долям при постраничной выгрузке через handler; (пики, число страниц)'''
+    marks = []
+    seen = 0
+    pages = 0
+    step = max(rows // 10, 1)
+    cursor = None
+    while True:
+        query = {'action': 'export', 'format': fmt}
+        if cursor:
+            query['cursor'] = cursor
+        response = handler(event(query=query), None)
+        if response['statusCode'] != 200:
+            raise RuntimeError(f"HTTP {response['statusCode']}: {response.get('body')}")
+        seen += response['body'].count('\n')
+        pages += 1
+        del response['body']
+        while seen >= step * (len(marks) + 1):
+            marks.append(peak_rss_mb())
+        cursor = response['headers'].get('X-Next-Cursor')
+        if not cursor:
+            return marks, pages
+
+
+def fetchall_size_mb(dsn: str, rows: int) -> float:
+    '''Сколько памяти заняли бы строки при fetchall() — для сравнения, на части строк'''
+    sample = min(rows, 100_000)
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        before = peak_rss_mb()
+        cur.execute(f'SELECT * FROM {SCHEMA}.transactions LIMIT %s', (sample,))
+        data = cur.fetchall()
+        body = json.dumps([list(row) for row in data], default=str)
+        grown = peak_rss_mb() - before
+        del data, body
+    conn.close()
+    return grown * rows / sample
+
+
+def report(name: str, marks: list, limit: float) -> bool:
+    growth = marks[-1] - marks[0]
+    print(f"{name:8} peak RSS by tenth: {' '.join(f'{m:.0f}' for m in marks)} MB; growth {growth:.1f} MB")
+    return growth < limit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='DSN сервера Postgres')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+    parser.add_argument('--max-growth', type=float, default=20.0, help='допустимый рост пика RSS, МБ')
+    args = parser.parse_args()
+
+    server_dsn, server = start_server(args.dsn)
+    try:
+        dsn = create_database(server_dsn)
+        apply_schema(dsn)
+        started = time.perf_counter()
+        seed(dsn, args.rows)
+        print(f'seeded {args.rows} transactions in {time.perf_counter() - started:.1f} s')
+
+        handler, _ = load_handler('budget', dsn)
+
+        started = time.perf_counter()
+        stream_ok = report('stream', check_stream(dsn, args.rows, args.format), args.max_growth)
+        print(f'         {time.perf_counter() - started:.1f} s')
+
+        started = time.perf_counter()
+        marks, pages = check_handler(handler, args.rows, args.format)
+        handler_ok = report('handler', marks, args.max_growth)
+        print(f'         {time.perf_counter() - started:.1f} s, {pages} pages')
+
+        print(f'fetchall() of all rows would need about {fetchall_size_mb(dsn, args.rows):.0f} MB')
+        if not (stream_ok and handler_ok):
+            print('FAIL: memory grows with row count')
+            sys.exit(1)
+        print('OK')
+    finally:
+        if server is not None:
+            server.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+'''Проверка списания запасов при параллельных приготовлениях и покупках
+
+Поднимает одноразовую базу (как bench_handlers.py), кладёт на склад 1000 г муки,
+планирует рецепт с двумя ингредиентами на один и тот же продукт и одновременно
+запускает N приготовлений (menu, action=prepare) и M покупок этого же продукта
+(shopping, PUT с местом хранения). Итоговый остаток должен точно совпасть с
+расчётным — потерянное обновление даст расхождение и ненулевой код выхода.
+
+Запуск:
+    python benchmarks/check_prepare_concurrency.py
+    python benchmarks/check_prepare_concurrency.py --dsn postgresql://postgres@localhost/postgres --prepares 50
+'''
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_handlers import SCHEMA, apply_schema, create_database, event, load_handler, start_server  # noqa: E402
+
+INITIAL_STOCK = Decimal('1000')
+INGREDIENTS = (('Мука', Decimal('10')), ('мука ', Decimal('5')))
+PURCHASE_QUANTITY = Decimal('3')
+
+
+def seed(dsn: str) -> tuple:
+    '''Место хранения, продукт и рецепт; возвращает (id места, id продукта, id рецепта)'''
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(f'SET search_path TO {SCHEMA}')
+        cur.execute("INSERT INTO storage_locations (name, icon, color) VALUES ('Шкаф', 'box', 'gray') RETURNING id")
+        location_id = str(cur.fetchone()[0])
+        cur.execute(
+            '''INSERT INTO products (name, quantity, unit, storage_location_id)
+               VALUES ('Мука', %s, 'г', %s) RETURNING id''',
+            (INITIAL_STOCK, location_id)
+        )
+        product_id = str(cur.fetchone()[0])
+        cur.execute(
+            "INSERT INTO recipes (name, servings) VALUES ('Блины', 2) RETURNING id"
+        )
+        recipe_id = str(cur.fetchone()[0])
+        for name, quantity in INGREDIENTS:
+            cur.execute(
+                "INSERT INTO recipe_ingredients (recipe_id, product_name, quantity, unit) VALUES (%s, %s, %s, 'г')",
+                (recipe_id, name, quantity)
+            )
+    conn.commit()
+    conn.close()
+    return location_id, product_id, recipe_id
+
+
+def stock_of(dsn: str, product_id: str) -> Decimal:
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT quantity FROM {SCHEMA}.products WHERE id = %s', (product_id,))
+        quantity = cur.fetchone()[0]
+    conn.close()
+    return quantity
+
+
+def body_of(response: dict) -> dict:
+    if response['statusCode'] >= 400:
+        raise RuntimeError(f"HTTP {response['statusCode']}: {response.get('body')}")
+    return json.loads(response['body'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='DSN сервера Postgres')
+    parser.add_argument('--prepares', type=int, default=20)
+    parser.add_argument('--purchases', type=int, default=10)
+    args = parser.parse_args()
+
+    server_dsn, server = start_server(args.dsn)
+    try:
+        dsn = create_database(server_dsn)
+        apply_schema(dsn)
+        location_id, product_id, recipe_id = seed(dsn)
+
+        menu, _ = load_handler('menu', dsn)
+        shopping, _ = load_handler('shopping', dsn)
+
+        planned_ids = [
+            body_of(menu(event('POST', {'action': 'plan_recipe'}, {'recipe_id': recipe_id}), None))['planned']['id']
+            for _ in range(args.prepares)
+        ]
+        item_ids = [
+            body_of(shopping(event('POST', body={'name': 'Мука', 'quantity': float(PURCHASE_QUANTITY), 'unit': 'г'}),
+                             None))['id']
+            for _ in range(args.purchases)
+        ]
+
+        start = threading.Barrier(args.prepares + args.purchases)
+
+        def prepare(planned_id):
+            start.wait()
+            return body_of(menu(event('POST', {'action': 'prepare'}, {'planned_id': planned_id}), None))
+
+        def purchase(item_id):
+            start.wait()
+            return body_of(shopping(event('PUT', {'id': item_id},
+                                          {'isPurchased': True, 'storageLocationId': location_id}), None))
+
+        with ThreadPoolExecutor(max_workers=args.prepares + args.purchases) as pool:
+            futures = [pool.submit(prepare, planned_id) for planned_id in planned_ids]
+            futures += [pool.submit(purchase, item_id) for item_id in item_ids]
+            for future in futures:
+                future.result()
+
+        per_prepare = sum(quantity for _, quantity in INGREDIENTS)
+        expected = max(INITIAL_STOCK - per_prepare * args.prepares, 0) + PURCHASE_QUANTITY * args.purchases
+        actual = stock_of(dsn, product_id)
+        print(f'{args.prepares} prepares x {per_prepare} г, {args.purchases} purchases x {PURCHASE_QUANTITY} г')
+        print(f'expected stock {expected}, actual {actual}')
+        if actual != expected:
+            print('FAIL: lost update')
+            sys.exit(1)
+        print('OK')
+    finally:
+        if server is not None:
+            server.cleanup()
+
+
+if __name__ == '__main__':
+    main()
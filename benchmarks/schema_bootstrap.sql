@@ -0,0 +1,70 @@
+-- Таблицы, которые существовали до истории db_migrations (создавались платформой).
+-- Применяется к пустой базе перед миграциями, чтобы V0001+ накатывались как в проде.
+CREATE TABLE IF NOT EXISTS storage_locations (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    name VARCHAR(100) NOT NULL,
+    icon VARCHAR(50) NOT NULL,
+    color VARCHAR(50) NOT NULL,
+    items_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS products (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    name VARCHAR(200) NOT NULL,
+    quantity DECIMAL(10, 2) NOT NULL,
+    unit VARCHAR(20) NOT NULL,
+    category VARCHAR(100),
+    expiry_date DATE,
+    storage_location_id UUID NOT NULL REFERENCES storage_locations(id),
+    added_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT,
+    calories_per_100g INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS budget_categories (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    name VARCHAR(100) NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    icon VARCHAR(50),
+    color VARCHAR(50),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS receipts (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    qr_code TEXT,
+    receipt_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    store_name VARCHAR(200),
+    total_amount DECIMAL(10, 2),
+    status VARCHAR(20) DEFAULT 'pending',
+    is_distributed BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS receipt_items (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    receipt_id UUID NOT NULL REFERENCES receipts(id),
+    name VARCHAR(200) NOT NULL,
+    quantity DECIMAL(10, 2) NOT NULL,
+    unit VARCHAR(20) DEFAULT 'шт',
+    price DECIMAL(10, 2),
+    total DECIMAL(10, 2),
+    total_price DECIMAL(10, 2),
+    category_id UUID REFERENCES budget_categories(id),
+    storage_location_id UUID REFERENCES storage_locations(id),
+    is_distributed BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    type VARCHAR(20) NOT NULL,
+    amount DECIMAL(12, 2) NOT NULL,
+    category_id UUID REFERENCES budget_categories(id),
+    description TEXT,
+    date DATE NOT NULL DEFAULT CURRENT_DATE,
+    receipt_id UUID REFERENCES receipts(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
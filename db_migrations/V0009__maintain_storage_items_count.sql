@@ -0,0 +1,69 @@
+-- Счётчик товаров в местах хранения поддерживается триггерами на products,
+-- поэтому остаётся согласованным для любых путей записи (склад, покупки, меню)
+CREATE OR REPLACE FUNCTION t_p56038920_home_inventory_track.sync_storage_items_count()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE t_p56038920_home_inventory_track.storage_locations sl
+        SET items_count = COALESCE(sl.items_count, 0) + d.delta
+        FROM (
+            SELECT storage_location_id, COUNT(*) AS delta
+            FROM new_rows
+            GROUP BY storage_location_id
+        ) d
+        WHERE sl.id = d.storage_location_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE t_p56038920_home_inventory_track.storage_locations sl
+        SET items_count = GREATEST(COALESCE(sl.items_count, 0) - d.delta, 0)
+        FROM (
+            SELECT storage_location_id, COUNT(*) AS delta
+            FROM old_rows
+            GROUP BY storage_location_id
+        ) d
+        WHERE sl.id = d.storage_location_id;
+    ELSE
+        UPDATE t_p56038920_home_inventory_track.storage_locations sl
+        SET items_count = GREATEST(COALESCE(sl.items_count, 0) + d.delta, 0)
+        FROM (
+            SELECT location_id, SUM(delta) AS delta
+            FROM (
+                SELECT n.storage_location_id AS location_id, 1 AS delta
+                FROM new_rows n JOIN old_rows o ON o.id = n.id
+                WHERE o.storage_location_id IS DISTINCT FROM n.storage_location_id
+                UNION ALL
+                SELECT o.storage_location_id, -1
+                FROM new_rows n JOIN old_rows o ON o.id = n.id
+                WHERE o.storage_location_id IS DISTINCT FROM n.storage_location_id
+            ) moves
+            GROUP BY location_id
+        ) d
+        WHERE sl.id = d.location_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_products_items_count_insert ON t_p56038920_home_inventory_track.products;
+CREATE TRIGGER trg_products_items_count_insert
+    AFTER INSERT ON t_p56038920_home_inventory_track.products
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.sync_storage_items_count();
+
+DROP TRIGGER IF EXISTS trg_products_items_count_delete ON t_p56038920_home_inventory_track.products;
+CREATE TRIGGER trg_products_items_count_delete
+    AFTER DELETE ON t_p56038920_home_inventory_track.products
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.sync_storage_items_count();
+
+DROP TRIGGER IF EXISTS trg_products_items_count_move ON t_p56038920_home_inventory_track.products;
+CREATE TRIGGER trg_products_items_count_move
+    AFTER UPDATE ON t_p56038920_home_inventory_track.products
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.sync_storage_items_count();
+
+-- Начальное заполнение счётчика
+UPDATE t_p56038920_home_inventory_track.storage_locations sl
+SET items_count = (
+    SELECT COUNT(*) FROM t_p56038920_home_inventory_track.products p
+    WHERE p.storage_location_id = sl.id
+);
@@ -0,0 +1,17 @@
+-- Нормализованное имя для поиска без учёта регистра и пробелов по краям
+ALTER TABLE t_p56038920_home_inventory_track.product_catalog
+    ADD COLUMN IF NOT EXISTS name_key TEXT GENERATED ALWAYS AS (LOWER(TRIM(name))) STORED;
+
+ALTER TABLE t_p56038920_home_inventory_track.shopping_items
+    ADD COLUMN IF NOT EXISTS name_key TEXT GENERATED ALWAYS AS (LOWER(TRIM(name))) STORED;
+
+ALTER TABLE t_p56038920_home_inventory_track.products
+    ADD COLUMN IF NOT EXISTS name_key TEXT GENERATED ALWAYS AS (LOWER(TRIM(name))) STORED;
+
+COMMENT ON COLUMN t_p56038920_home_inventory_track.product_catalog.name_key IS 'LOWER(TRIM(name)) для сопоставления по имени';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.shopping_items.name_key IS 'LOWER(TRIM(name)) для сопоставления по имени';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.products.name_key IS 'LOWER(TRIM(name)) для сопоставления по имени';
+
+CREATE INDEX IF NOT EXISTS idx_product_catalog_name_key ON t_p56038920_home_inventory_track.product_catalog(name_key);
+CREATE INDEX IF NOT EXISTS idx_shopping_items_open_name_key ON t_p56038920_home_inventory_track.shopping_items(name_key) WHERE is_purchased = FALSE;
+CREATE INDEX IF NOT EXISTS idx_products_name_key_location ON t_p56038920_home_inventory_track.products(name_key, storage_location_id);
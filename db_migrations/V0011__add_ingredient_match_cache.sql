@@ -0,0 +1,14 @@
+-- Кэш сопоставлений ингредиентов рецептов с продуктами на складе
+CREATE TABLE IF NOT EXISTS t_p56038920_home_inventory_track.ingredient_match_cache (
+    ingredient_key TEXT PRIMARY KEY,
+    product_id UUID,
+    inventory_version VARCHAR(32) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE t_p56038920_home_inventory_track.ingredient_match_cache IS 'Кэш нечёткого поиска ингредиент → продукт (включается MATCH_CACHE_DB=1)';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.ingredient_match_cache.ingredient_key IS 'Название ингредиента в нижнем регистре';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.ingredient_match_cache.product_id IS 'Найденный продукт или NULL, если совпадения нет';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.ingredient_match_cache.inventory_version IS 'Отпечаток набора продуктов в наличии, для которого найдено совпадение';
+
+CREATE INDEX IF NOT EXISTS idx_ingredient_match_cache_version ON t_p56038920_home_inventory_track.ingredient_match_cache(inventory_version);
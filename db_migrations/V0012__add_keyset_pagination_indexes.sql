@@ -0,0 +1,12 @@
+-- Индексы под постраничную выдачу по ключу (keyset pagination)
+CREATE INDEX IF NOT EXISTS idx_transactions_date_created_id
+    ON t_p56038920_home_inventory_track.transactions(date DESC, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_receipts_created_id
+    ON t_p56038920_home_inventory_track.receipts(created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_shopping_items_purchased_added_id
+    ON t_p56038920_home_inventory_track.shopping_items(is_purchased, added_date DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_products_location_added_id
+    ON t_p56038920_home_inventory_track.products(storage_location_id, added_date DESC, id DESC);
@@ -0,0 +1,72 @@
+-- Дневные суммы транзакций по категориям для аналитики и сводки бюджета
+CREATE TABLE IF NOT EXISTS t_p56038920_home_inventory_track.daily_category_totals (
+    date DATE NOT NULL,
+    category_id UUID,
+    type VARCHAR(20) NOT NULL,
+    total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    transactions_count INTEGER NOT NULL DEFAULT 0
+);
+
+COMMENT ON TABLE t_p56038920_home_inventory_track.daily_category_totals IS 'Сумма и число транзакций за день по категории и типу; ведётся триггерами на transactions';
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_category_totals_key
+    ON t_p56038920_home_inventory_track.daily_category_totals(
+        date, type, (COALESCE(category_id, '00000000-0000-0000-0000-000000000000'::uuid))
+    );
+
+CREATE INDEX IF NOT EXISTS idx_daily_category_totals_category
+    ON t_p56038920_home_inventory_track.daily_category_totals(category_id, date);
+
+CREATE OR REPLACE FUNCTION t_p56038920_home_inventory_track.sync_daily_category_totals()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO t_p56038920_home_inventory_track.daily_category_totals AS d
+            (date, category_id, type, total, transactions_count)
+        SELECT date, category_id, type, SUM(amount), COUNT(*)
+        FROM new_rows
+        GROUP BY date, category_id, type
+        ON CONFLICT (date, type, (COALESCE(category_id, '00000000-0000-0000-0000-000000000000'::uuid)))
+        DO UPDATE SET
+            total = d.total + EXCLUDED.total,
+            transactions_count = d.transactions_count + EXCLUDED.transactions_count;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO t_p56038920_home_inventory_track.daily_category_totals AS d
+            (date, category_id, type, total, transactions_count)
+        SELECT date, category_id, type, -SUM(amount), -COUNT(*)
+        FROM old_rows
+        GROUP BY date, category_id, type
+        ON CONFLICT (date, type, (COALESCE(category_id, '00000000-0000-0000-0000-000000000000'::uuid)))
+        DO UPDATE SET
+            total = d.total + EXCLUDED.total,
+            transactions_count = d.transactions_count + EXCLUDED.transactions_count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_transactions_totals_insert ON t_p56038920_home_inventory_track.transactions;
+CREATE TRIGGER trg_transactions_totals_insert
+    AFTER INSERT ON t_p56038920_home_inventory_track.transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.sync_daily_category_totals();
+
+DROP TRIGGER IF EXISTS trg_transactions_totals_delete ON t_p56038920_home_inventory_track.transactions;
+CREATE TRIGGER trg_transactions_totals_delete
+    AFTER DELETE ON t_p56038920_home_inventory_track.transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.sync_daily_category_totals();
+
+DROP TRIGGER IF EXISTS trg_transactions_totals_update ON t_p56038920_home_inventory_track.transactions;
+CREATE TRIGGER trg_transactions_totals_update
+    AFTER UPDATE ON t_p56038920_home_inventory_track.transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.sync_daily_category_totals();
+
+-- Начальное заполнение из существующих транзакций
+DELETE FROM t_p56038920_home_inventory_track.daily_category_totals;
+INSERT INTO t_p56038920_home_inventory_track.daily_category_totals (date, category_id, type, total, transactions_count)
+SELECT date, category_id, type, SUM(amount), COUNT(*)
+FROM t_p56038920_home_inventory_track.transactions
+GROUP BY date, category_id, type;
@@ -0,0 +1,34 @@
+-- Счётчики версий справочников для ETag: любое изменение таблицы увеличивает версию
+CREATE TABLE IF NOT EXISTS t_p56038920_home_inventory_track.reference_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE t_p56038920_home_inventory_track.reference_versions IS 'Версия справочника (имя таблицы); ведётся триггерами, используется для условных GET';
+
+CREATE OR REPLACE FUNCTION t_p56038920_home_inventory_track.bump_reference_version()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO t_p56038920_home_inventory_track.reference_versions AS r (name)
+    VALUES (TG_ARGV[0])
+    ON CONFLICT (name) DO UPDATE SET
+        version = r.version + 1,
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_product_catalog_version ON t_p56038920_home_inventory_track.product_catalog;
+CREATE TRIGGER trg_product_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p56038920_home_inventory_track.product_catalog
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.bump_reference_version('product_catalog');
+
+DROP TRIGGER IF EXISTS trg_budget_categories_version ON t_p56038920_home_inventory_track.budget_categories;
+CREATE TRIGGER trg_budget_categories_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON t_p56038920_home_inventory_track.budget_categories
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.bump_reference_version('budget_categories');
+
+INSERT INTO t_p56038920_home_inventory_track.reference_versions (name)
+VALUES ('product_catalog'), ('budget_categories')
+ON CONFLICT (name) DO NOTHING;
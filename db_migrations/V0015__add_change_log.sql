@@ -0,0 +1,54 @@
+-- Журнал изменений строк для синхронизации клиентов по токену (since=...).
+-- txid — номер транзакции записи: токен хранит xmin снимка, и все изменения
+-- транзакций, не завершённых к моменту выдачи токена, попадут в следующий ответ
+CREATE TABLE IF NOT EXISTS t_p56038920_home_inventory_track.change_log (
+    id BIGSERIAL PRIMARY KEY,
+    table_name VARCHAR(50) NOT NULL,
+    row_id UUID NOT NULL,
+    operation CHAR(1) NOT NULL,
+    txid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE t_p56038920_home_inventory_track.change_log IS 'Изменённые строки (U — вставка или изменение, D — удаление); ведётся триггерами';
+
+CREATE INDEX IF NOT EXISTS idx_change_log_table_txid
+    ON t_p56038920_home_inventory_track.change_log(table_name, txid);
+
+CREATE INDEX IF NOT EXISTS idx_change_log_changed_at
+    ON t_p56038920_home_inventory_track.change_log(changed_at);
+
+CREATE OR REPLACE FUNCTION t_p56038920_home_inventory_track.log_row_changes()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO t_p56038920_home_inventory_track.change_log (table_name, row_id, operation)
+        SELECT TG_TABLE_NAME, id, 'D' FROM old_rows;
+    ELSE
+        INSERT INTO t_p56038920_home_inventory_track.change_log (table_name, row_id, operation)
+        SELECT TG_TABLE_NAME, id, 'U' FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['products', 'storage_locations', 'shopping_items', 'food_diary'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_changes_insert ON t_p56038920_home_inventory_track.%I', t, t);
+        EXECUTE format('CREATE TRIGGER trg_%s_changes_insert AFTER INSERT ON t_p56038920_home_inventory_track.%I
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.log_row_changes()', t, t);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_changes_update ON t_p56038920_home_inventory_track.%I', t, t);
+        EXECUTE format('CREATE TRIGGER trg_%s_changes_update AFTER UPDATE ON t_p56038920_home_inventory_track.%I
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.log_row_changes()', t, t);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_changes_delete ON t_p56038920_home_inventory_track.%I', t, t);
+        EXECUTE format('CREATE TRIGGER trg_%s_changes_delete AFTER DELETE ON t_p56038920_home_inventory_track.%I
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.log_row_changes()', t, t);
+    END LOOP;
+END;
+$$;
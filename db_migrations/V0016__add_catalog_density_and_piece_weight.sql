@@ -0,0 +1,7 @@
+-- Свойства продукта для пересчёта единиц: плотность (г/мл) и вес одной штуки (г)
+ALTER TABLE t_p56038920_home_inventory_track.product_catalog
+    ADD COLUMN IF NOT EXISTS density DECIMAL(8, 3),
+    ADD COLUMN IF NOT EXISTS piece_weight DECIMAL(10, 2);
+
+COMMENT ON COLUMN t_p56038920_home_inventory_track.product_catalog.density IS 'Плотность, г/мл; если не задана, пересчёт объёма в массу идёт как для воды';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.product_catalog.piece_weight IS 'Вес одной штуки, г; без него штуки не пересчитываются в массу и объём';
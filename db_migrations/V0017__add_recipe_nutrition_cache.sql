@@ -0,0 +1,102 @@
+-- Рассчитанная калорийность рецептов из recipe_ingredients × product_catalog.
+-- Значения кэшируются в строке рецепта; триггеры помечают рецепт устаревшим, когда
+-- меняются его ингредиенты или используемые ими поля справочника, а пересчёт всех
+-- помеченных рецептов делает функция menu пакетно при следующем чтении
+ALTER TABLE t_p56038920_home_inventory_track.recipes
+    ADD COLUMN IF NOT EXISTS calories_per_serving DECIMAL(10, 1),
+    ADD COLUMN IF NOT EXISTS calories_per_100g DECIMAL(10, 1),
+    ADD COLUMN IF NOT EXISTS ingredients_weight DECIMAL(12, 1),
+    ADD COLUMN IF NOT EXISTS nutrition_stale BOOLEAN NOT NULL DEFAULT TRUE;
+
+COMMENT ON COLUMN t_p56038920_home_inventory_track.recipes.calories_per_serving IS 'Калорий на порцию: total_calories / servings';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.recipes.calories_per_100g IS 'Калорий на 100 г сырых ингредиентов; NULL, если ни один ингредиент не найден в справочнике';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.recipes.ingredients_weight IS 'Суммарный вес ингредиентов в граммах, пересчитанный по единицам';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.recipes.nutrition_stale IS 'Калорийность нужно пересчитать; ставится триггерами';
+
+CREATE INDEX IF NOT EXISTS idx_recipes_nutrition_stale
+    ON t_p56038920_home_inventory_track.recipes(id) WHERE nutrition_stale;
+
+CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_name_key
+    ON t_p56038920_home_inventory_track.recipe_ingredients(LOWER(TRIM(product_name)));
+
+CREATE OR REPLACE FUNCTION t_p56038920_home_inventory_track.mark_recipes_stale_by_ingredients()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE t_p56038920_home_inventory_track.recipes SET nutrition_stale = TRUE
+        WHERE id IN (SELECT recipe_id FROM new_rows) AND NOT nutrition_stale;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE t_p56038920_home_inventory_track.recipes SET nutrition_stale = TRUE
+        WHERE id IN (SELECT recipe_id FROM old_rows) AND NOT nutrition_stale;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Изменение справочника затрагивает только рецепты с ингредиентами того же названия;
+-- при UPDATE учитываются лишь строки, где поменялись поля, влияющие на расчёт
+CREATE OR REPLACE FUNCTION t_p56038920_home_inventory_track.mark_recipes_stale_by_catalog()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE t_p56038920_home_inventory_track.recipes r SET nutrition_stale = TRUE
+        FROM t_p56038920_home_inventory_track.recipe_ingredients ri
+        WHERE ri.recipe_id = r.id AND NOT r.nutrition_stale
+          AND LOWER(TRIM(ri.product_name)) IN (SELECT name_key FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE t_p56038920_home_inventory_track.recipes r SET nutrition_stale = TRUE
+        FROM t_p56038920_home_inventory_track.recipe_ingredients ri
+        WHERE ri.recipe_id = r.id AND NOT r.nutrition_stale
+          AND LOWER(TRIM(ri.product_name)) IN (SELECT name_key FROM old_rows);
+    ELSE
+        UPDATE t_p56038920_home_inventory_track.recipes r SET nutrition_stale = TRUE
+        FROM t_p56038920_home_inventory_track.recipe_ingredients ri
+        WHERE ri.recipe_id = r.id AND NOT r.nutrition_stale
+          AND LOWER(TRIM(ri.product_name)) IN (
+              SELECT k.name_key
+              FROM old_rows o JOIN new_rows n ON n.id = o.id,
+                   LATERAL (VALUES (o.name_key), (n.name_key)) AS k(name_key)
+              WHERE (o.name_key, o.calories_per_100g, o.density, o.piece_weight)
+                    IS DISTINCT FROM (n.name_key, n.calories_per_100g, n.density, n.piece_weight)
+          );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_recipe_ingredients_nutrition_insert ON t_p56038920_home_inventory_track.recipe_ingredients;
+CREATE TRIGGER trg_recipe_ingredients_nutrition_insert
+    AFTER INSERT ON t_p56038920_home_inventory_track.recipe_ingredients
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.mark_recipes_stale_by_ingredients();
+
+DROP TRIGGER IF EXISTS trg_recipe_ingredients_nutrition_update ON t_p56038920_home_inventory_track.recipe_ingredients;
+CREATE TRIGGER trg_recipe_ingredients_nutrition_update
+    AFTER UPDATE ON t_p56038920_home_inventory_track.recipe_ingredients
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.mark_recipes_stale_by_ingredients();
+
+DROP TRIGGER IF EXISTS trg_recipe_ingredients_nutrition_delete ON t_p56038920_home_inventory_track.recipe_ingredients;
+CREATE TRIGGER trg_recipe_ingredients_nutrition_delete
+    AFTER DELETE ON t_p56038920_home_inventory_track.recipe_ingredients
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.mark_recipes_stale_by_ingredients();
+
+DROP TRIGGER IF EXISTS trg_product_catalog_nutrition_insert ON t_p56038920_home_inventory_track.product_catalog;
+CREATE TRIGGER trg_product_catalog_nutrition_insert
+    AFTER INSERT ON t_p56038920_home_inventory_track.product_catalog
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.mark_recipes_stale_by_catalog();
+
+DROP TRIGGER IF EXISTS trg_product_catalog_nutrition_update ON t_p56038920_home_inventory_track.product_catalog;
+CREATE TRIGGER trg_product_catalog_nutrition_update
+    AFTER UPDATE ON t_p56038920_home_inventory_track.product_catalog
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.mark_recipes_stale_by_catalog();
+
+DROP TRIGGER IF EXISTS trg_product_catalog_nutrition_delete ON t_p56038920_home_inventory_track.product_catalog;
+CREATE TRIGGER trg_product_catalog_nutrition_delete
+    AFTER DELETE ON t_p56038920_home_inventory_track.product_catalog
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p56038920_home_inventory_track.mark_recipes_stale_by_catalog();
@@ -0,0 +1,23 @@
+-- Очередь обработки чеков: POST сохраняет исходные данные и отвечает сразу,
+-- разбор позиций, справочник, покупки и проводку в бюджет делает обработчик очереди
+ALTER TABLE t_p56038920_home_inventory_track.receipts
+    ADD COLUMN IF NOT EXISTS payload JSONB,
+    ADD COLUMN IF NOT EXISTS items_count INTEGER,
+    ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS last_error TEXT,
+    ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP;
+
+COMMENT ON COLUMN t_p56038920_home_inventory_track.receipts.payload IS 'Тело POST-запроса чека как есть; обрабатывается очередью';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.receipts.attempts IS 'Число неудачных попыток обработки';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.receipts.last_error IS 'Ошибка последней неудачной попытки';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.receipts.next_attempt_at IS 'Не раньше этого времени чек можно брать в обработку (экспоненциальная задержка повторов)';
+
+-- Чеки, созданные до очереди, уже обработаны синхронно
+UPDATE t_p56038920_home_inventory_track.receipts
+SET status = 'processed'
+WHERE status = 'pending' AND payload IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_receipts_pending_queue
+    ON t_p56038920_home_inventory_track.receipts(next_attempt_at, created_at)
+    WHERE status = 'pending';
@@ -0,0 +1,17 @@
+-- Повторная отправка того же чека (повтор запроса с телефона) не создаёт второй чек:
+-- qr_hash — SHA-256 нормализованного QR-кода (считается функцией receipts),
+-- idempotency_key — заголовок Idempotency-Key клиента. Оба уникальны, если заданы
+ALTER TABLE t_p56038920_home_inventory_track.receipts
+    ADD COLUMN IF NOT EXISTS qr_hash CHAR(64),
+    ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255);
+
+COMMENT ON COLUMN t_p56038920_home_inventory_track.receipts.qr_hash IS 'SHA-256 нормализованного qr_code; у чеков до этой миграции NULL';
+COMMENT ON COLUMN t_p56038920_home_inventory_track.receipts.idempotency_key IS 'Значение заголовка Idempotency-Key запроса, создавшего чек';
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_receipts_qr_hash
+    ON t_p56038920_home_inventory_track.receipts(qr_hash)
+    WHERE qr_hash IS NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_receipts_idempotency_key
+    ON t_p56038920_home_inventory_track.receipts(idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
@@ -0,0 +1,37 @@
+-- Массовый импорт справочника обновляет десятки тысяч строк одним оператором.
+-- Соединение old_rows с new_rows по id в триггере планировалось вложенным циклом
+-- (план кэшируется с первого небольшого вызова) и становилось квадратичным.
+-- Изменившиеся строки находятся разностью множеств: старые значения, которых нет
+-- среди новых, и новые, которых не было среди старых, — без соединения
+CREATE OR REPLACE FUNCTION t_p56038920_home_inventory_track.mark_recipes_stale_by_catalog()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE t_p56038920_home_inventory_track.recipes r SET nutrition_stale = TRUE
+        FROM t_p56038920_home_inventory_track.recipe_ingredients ri
+        WHERE ri.recipe_id = r.id AND NOT r.nutrition_stale
+          AND LOWER(TRIM(ri.product_name)) IN (SELECT name_key FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE t_p56038920_home_inventory_track.recipes r SET nutrition_stale = TRUE
+        FROM t_p56038920_home_inventory_track.recipe_ingredients ri
+        WHERE ri.recipe_id = r.id AND NOT r.nutrition_stale
+          AND LOWER(TRIM(ri.product_name)) IN (SELECT name_key FROM old_rows);
+    ELSE
+        UPDATE t_p56038920_home_inventory_track.recipes r SET nutrition_stale = TRUE
+        FROM t_p56038920_home_inventory_track.recipe_ingredients ri
+        WHERE ri.recipe_id = r.id AND NOT r.nutrition_stale
+          AND LOWER(TRIM(ri.product_name)) IN (
+              SELECT changed.name_key FROM (
+                  (SELECT name_key, calories_per_100g, density, piece_weight FROM old_rows
+                   EXCEPT
+                   SELECT name_key, calories_per_100g, density, piece_weight FROM new_rows)
+                  UNION ALL
+                  (SELECT name_key, calories_per_100g, density, piece_weight FROM new_rows
+                   EXCEPT
+                   SELECT name_key, calories_per_100g, density, piece_weight FROM old_rows)
+              ) AS changed
+          );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
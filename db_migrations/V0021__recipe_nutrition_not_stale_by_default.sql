@@ -0,0 +1,9 @@
+-- Пересчёт калорийности больше не идёт при чтении, а частичный расчёт не заменяет
+-- введённую вручную total_calories. Рецепты, существовавшие до V0017 и ещё ни разу
+-- не пересчитанные, не помечаются устаревшими: их значения остаются как были,
+-- пока не изменятся ингредиенты или справочник (тогда флаг поставят триггеры)
+ALTER TABLE t_p56038920_home_inventory_track.recipes
+    ALTER COLUMN nutrition_stale SET DEFAULT FALSE;
+
+UPDATE t_p56038920_home_inventory_track.recipes SET nutrition_stale = FALSE
+WHERE nutrition_stale AND ingredients_weight IS NULL AND calories_per_100g IS NULL;
@@ -13,6 +13,8 @@ export interface StorageLocation {
   color: string;
   items_count: number;
   created_at: string;
+  expiring_soon_count?: number;
+  total_value?: number;
 }
 
 export interface Product {
@@ -318,11 +320,19 @@ export const foodDiaryApi = {
 export interface Receipt {
   id: string;
   qr_code: string;
-  total_amount: number;
-  status: string;
+  total_amount: number | null;
+  status: 'pending' | 'processed' | 'failed';
+  items_count?: number;
   created_at: string;
 }
 
+export interface ReceiptStatus extends Receipt {
+  attempts: number;
+  last_error: string | null;
+  next_attempt_at: string;
+  processed_at: string | null;
+}
+
 export const receiptApi = {
   async processReceipt(data: { 
     qr_code: string; 
@@ -334,7 +344,7 @@ export const receiptApi = {
       total: number;
       budget_category_name?: string;
     }> 
-  }): Promise<{ receipt: Receipt; total_amount: number; items_count: number }> {
+  }): Promise<{ receipt: Receipt; items_count: number }> {
     const response = await fetch(API_BASE.receipts, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
@@ -349,6 +359,18 @@ export const receiptApi = {
     if (!response.ok) throw new Error('Failed to fetch receipts');
     return response.json();
   },
+
+  async getReceiptStatus(id: string): Promise<ReceiptStatus> {
+    const response = await fetch(`${API_BASE.receipts}?id=${id}`);
+    if (!response.ok) throw new Error('Failed to fetch receipt status');
+    return response.json();
+  },
+
+  async processReceiptQueue(): Promise<{ claimed: number; processed: number; retried: number; failed: number }> {
+    const response = await fetch(`${API_BASE.receipts}?action=process`, { method: 'POST' });
+    if (!response.ok) throw new Error('Failed to process receipt queue');
+    return response.json();
+  },
 };
 
 export const menuApi = {
@@ -487,6 +509,15 @@ export interface ProductCatalog {
   created_at: string;
 }
 
+export interface ImportResult {
+  target: 'catalog' | 'products';
+  total: number;
+  inserted: number;
+  updated: number;
+  rejected: number;
+  errors: { line: number; error: string }[];
+}
+
 export const catalogApi = {
   async getProducts(): Promise<ProductCatalog[]> {
     const response = await fetch(`${API_BASE.storage}?action=catalog`);
@@ -531,4 +562,15 @@ export const catalogApi = {
     });
     if (!response.ok) throw new Error('Failed to delete product');
   },
+
+  async importFile(file: File, target: 'catalog' | 'products' = 'catalog'): Promise<ImportResult> {
+    const format = file.name.toLowerCase().endsWith('.csv') ? 'csv' : 'ndjson';
+    const response = await fetch(`${API_BASE.storage}?action=import&target=${target}&format=${format}`, {
+      method: 'POST',
+      headers: { 'Content-Type': format === 'csv' ? 'text/csv' : 'application/x-ndjson' },
+      body: await file.text(),
+    });
+    if (!response.ok) throw new Error('Failed to import file');
+    return response.json();
+  },
 };
\ No newline at end of file
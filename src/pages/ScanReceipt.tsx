@@ -5,7 +5,7 @@ import { Card } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import Sidebar from '@/components/Sidebar';
-import { storageApi, StorageLocation, receiptApi } from '@/lib/api';
+import { storageApi, StorageLocation, receiptApi, Receipt } from '@/lib/api';
 import { toast } from 'sonner';
 import { Html5QrcodeScanner, Html5QrcodeScannerState } from 'html5-qrcode';
 
@@ -18,6 +18,26 @@ interface QRParams {
   n: string;
 }
 
+const RECEIPT_POLL_ATTEMPTS = 5;
+const RECEIPT_POLL_INTERVAL_MS = 1000;
+
+// Чек ставится в очередь; запускаем её обработку и ждём итогового статуса
+const waitForReceipt = async (receipt: Receipt): Promise<Receipt['status']> => {
+  let status = receipt.status;
+  for (let attempt = 0; attempt < RECEIPT_POLL_ATTEMPTS && status === 'pending'; attempt++) {
+    if (attempt > 0) {
+      await new Promise((resolve) => setTimeout(resolve, RECEIPT_POLL_INTERVAL_MS));
+    }
+    try {
+      await receiptApi.processReceiptQueue();
+      status = (await receiptApi.getReceiptStatus(receipt.id)).status;
+    } catch (error) {
+      console.warn('Receipt status check failed:', error);
+    }
+  }
+  return status;
+};
+
 const parseQRCode = (qrText: string): QRParams | null => {
   try {
     const url = new URL(qrText);
@@ -144,7 +164,7 @@ const ScanReceipt = () => {
               return;
             }
             
-            await receiptApi.processReceipt({
+            const { receipt } = await receiptApi.processReceipt({
               qr_code: decodedText,
               total_amount: receiptData.totalSum / 100,
               items: receiptData.items.map((item: any) => ({
@@ -156,7 +176,17 @@ const ScanReceipt = () => {
               }))
             });
             
-            toast.success(`Чек добавлен! ${receiptData.items.length} товаров на сумму ${(receiptData.totalSum / 100).toFixed(2)} ₽`);
+            const status = await waitForReceipt(receipt);
+            if (status === 'failed') {
+              toast.error('Не удалось обработать чек');
+              setIsProcessing(false);
+              return;
+            }
+            if (status === 'pending') {
+              toast.success('Чек принят и будет обработан в ближайшее время');
+            } else {
+              toast.success(`Чек добавлен! ${receiptData.items.length} товаров на сумму ${(receiptData.totalSum / 100).toFixed(2)} ₽`);
+            }
             setTimeout(() => navigate('/budget'), 500);
           } catch (error) {
             console.error('Receipt processing error:', error);